@@ -0,0 +1,236 @@
+"""Computations behind the dashboard views.
+
+Plain pandas functions without Streamlit calls, so they can be profiled, benchmarked,
+tested and cached on their own. The computations the dashboard calls are wrapped in
+@profiled: calls slower than ANALYTICS_SLOW_MS are logged, and callbacks in profile_hooks
+see every call. Small helpers they share (add_location, timeline_start) are not.
+"""
+import functools
+import logging
+import os
+import time
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Calls taking longer than this many milliseconds are logged as slow
+ANALYTICS_SLOW_MS = float(os.environ.get("ANALYTICS_SLOW_MS", "200"))
+
+# Callables receiving (function_name, seconds) after every profiled call, e.g. from bench/run.py
+profile_hooks = []
+
+
+def profiled(func):
+    """Times every call of func, logs slow calls and reports all calls to profile_hooks."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            if elapsed * 1000 >= ANALYTICS_SLOW_MS:
+                logger.warning("Slow analytics call %s: %.0f ms", func.__name__, elapsed * 1000)
+            for hook in profile_hooks:
+                hook(func.__name__, elapsed)
+    return wrapper
+
+
+# Compact in-memory schema: names repeat across thousands of rows and are stored as categoricals
+NAME_COLUMNS = ['artist_name', 'venue_name', 'city_name', 'country_name']
+COORD_COLUMNS = ['city_lat', 'city_long']
+
+@profiled
+def normalize_concerts(concerts):
+    """Converts loaded rows once into the compact schema used by all views.
+
+    Name columns become categoricals, event_date is parsed to datetime64, coordinates
+    are stored as float32 and a 'year' column is added.
+    """
+    if concerts.empty:
+        return concerts
+    concerts['event_date'] = pd.to_datetime(concerts['event_date'], errors='coerce')
+    concerts['year'] = concerts['event_date'].dt.year.astype('Int16')
+    for column in NAME_COLUMNS:
+        if column in concerts:
+            concerts[column] = concerts[column].astype('category')
+    for column in COORD_COLUMNS:
+        if column in concerts:
+            concerts[column] = pd.to_numeric(concerts[column], errors='coerce').astype('float32')
+    return concerts
+
+# Filter widgets and the Setlist columns they filter on
+FILTER_COLUMNS = {'artist': 'artist_name', 'venue': 'venue_name', 'city': 'city_name', 'country': 'country_name'}
+
+@profiled
+def filter_concerts(concerts, filters):
+    """Applies the dashboard filters in pandas, the counterpart of the Supabase filters for snapshots."""
+    mask = pd.Series(True, index=concerts.index)
+    for column in FILTER_COLUMNS.values():
+        if filters.get(column):
+            mask &= concerts[column].isin(filters[column])
+    first_year, last_year = filters['years']
+    mask &= concerts['year'].between(first_year, last_year).fillna(False).astype(bool)
+    return concerts[mask]
+
+@profiled
+def options_from_concerts(concerts):
+    """Filter options derived from the concert rows themselves."""
+    if concerts.empty:
+        return {}
+    columns = {**FILTER_COLUMNS, 'year': 'year'}
+    return {dimension: sorted(concerts[column].dropna().unique().tolist()) for dimension, column in columns.items()}
+
+# One event per date and location, shared by the past and upcoming views
+EVENT_KEYS = ['event_date', 'venue_name', 'city_name', 'city_lat', 'city_long', 'country_name']
+UPCOMING_EVENT_KEYS = ['event_date', 'venue_name', 'city_name', 'country_name']
+
+@profiled
+def group_events(concerts, keys):
+    """Groups concert rows into events with the lists of their artists and setlist urls."""
+    events = (
+        concerts.dropna(subset=['artist_name'])
+        .groupby(keys, observed=True)
+        .agg(artists=('artist_name', list), urls=('url', list), year=('year', 'first'))
+        .reset_index()
+    )
+    return add_location(events)
+
+def add_location(events):
+    # Combine venue, city, country into one location column
+    events['location'] = events['venue_name'].astype(str) + ", " + events['city_name'].astype(str) + ", " + events['country_name'].astype(str)
+    return events
+
+@profiled
+def latest_first_timer(concerts):
+    """Most recent concert of an artist seen only once, None if every artist was seen more often."""
+    counts = concerts['artist_name'].value_counts()
+    first_timers = concerts[concerts['artist_name'].isin(counts.index[counts == 1])]
+    if first_timers.empty:
+        return None
+    return first_timers.sort_values('event_date', ascending=False).iloc[0]
+
+@profiled
+def next_concert(upcoming):
+    """The earliest upcoming event with all of its artists, None without upcoming concerts."""
+    if upcoming.empty:
+        return None
+    upcoming = upcoming.sort_values('event_date', ascending=True)
+    first = upcoming.iloc[0]
+    same_event = (upcoming['event_date'] == first['event_date']) & (upcoming['venue_name'] == first['venue_name'])
+    return {
+        'event_date': first['event_date'],
+        'venue_name': first['venue_name'],
+        'city_name': first['city_name'],
+        'country_name': first['country_name'],
+        'artists': upcoming.loc[same_event, 'artist_name'].tolist(),
+    }
+
+@profiled
+def count_by(frame, column, stats=None, dimension=None):
+    """Attendances per value of a column, taken from the precomputed stats if given."""
+    if stats is not None:
+        data = stats[stats['dimension'] == dimension].rename(columns={'name': column, 'attendances': 'Attendances'})[[column, 'Attendances']]
+    else:
+        data = frame.groupby(column, observed=True).size().reset_index(name='Attendances')
+    return data.sort_values('Attendances', ascending=False)
+
+@profiled
+def yearly_counts(events, stats=None):
+    """Events per year in ascending order, with an integer 'year' and an 'Anzahl Konzerte' column."""
+    data = count_by(events, 'year', stats, 'year').rename(columns={'Attendances': 'Anzahl Konzerte'})
+    data['year'] = data['year'].astype(int)
+    return data.sort_values('year')
+
+@profiled
+def location_points(events):
+    """Events per venue with its coordinates, the counterpart of the MapLocation view for filtered events."""
+    return (
+        events.dropna(subset=['city_lat', 'city_long'])
+        .groupby(['venue_name', 'city_name', 'country_name'], observed=True)
+        .agg(latitude=('city_lat', 'first'), longitude=('city_long', 'first'), events=('event_date', 'size'))
+        .reset_index()
+    )
+
+# Width of a map cluster in screen pixels; at zoom z the world is 256 * 2^z pixels wide
+MAP_CLUSTER_PX = 40
+
+@profiled
+def cluster_locations(points, zoom):
+    """Merges locations closer than MAP_CLUSTER_PX at the given zoom level into one point.
+
+    Clusters are grid cells in degrees, positioned at the event-weighted mean of their
+    locations and labelled with their busiest venue. 'radius' is a marker size in pixels.
+    """
+    if points.empty:
+        return pd.DataFrame(columns=['latitude', 'longitude', 'events', 'locations', 'label', 'radius'])
+    cell = MAP_CLUSTER_PX * 360 / (256 * 2 ** zoom)
+    points = points.assign(
+        latitude=points['latitude'].astype('float64'),
+        longitude=points['longitude'].astype('float64'),
+        label=points['venue_name'].astype(str) + ", " + points['city_name'].astype(str),
+        cell_lat=(points['latitude'] // cell).astype('int64'),
+        cell_long=(points['longitude'] // cell).astype('int64'),
+    )
+    points['weighted_lat'] = points['latitude'] * points['events']
+    points['weighted_long'] = points['longitude'] * points['events']
+
+    # The busiest venue of every cell names the cluster
+    points = points.sort_values('events', ascending=False)
+    clusters = points.groupby(['cell_lat', 'cell_long']).agg(
+        weighted_lat=('weighted_lat', 'sum'),
+        weighted_long=('weighted_long', 'sum'),
+        events=('events', 'sum'),
+        locations=('label', 'size'),
+        label=('label', 'first'),
+    ).reset_index(drop=True)
+
+    clusters['latitude'] = clusters['weighted_lat'] / clusters['events']
+    clusters['longitude'] = clusters['weighted_long'] / clusters['events']
+    more = clusters['locations'] > 1
+    clusters.loc[more, 'label'] += " und " + (clusters.loc[more, 'locations'] - 1).astype(str) + " weitere"
+    clusters['radius'] = 6 + 3 * clusters['events'] ** 0.5
+    return clusters[['latitude', 'longitude', 'events', 'locations', 'label', 'radius']]
+
+@profiled
+def song_occurrences(songs, concerts):
+    """Joins Song rows with the concerts they were played at, newest first.
+
+    Songs of setlists not in concerts are dropped, so the dashboard filters apply. Tape
+    entries (intros, outros) are dropped as well, like in the SongStats view.
+    """
+    if 'tape' in songs:
+        songs = songs[~songs['tape'].fillna(False).astype(bool)]
+    if songs.empty or concerts.empty:
+        return pd.DataFrame()
+    occurrences = songs.merge(
+        concerts[['id', 'event_date', 'artist_name', 'venue_name', 'city_name']],
+        left_on='setlist_id', right_on='id',
+    )
+    return occurrences.sort_values(['event_date', 'position'], ascending=[False, True])
+
+def timeline_start(events, months):
+    """Start of a timeline window of the given months ending at the latest event, None for the whole history."""
+    if months is None or events.empty:
+        return None
+    return events['event_date'].max() - pd.DateOffset(months=months)
+
+@profiled
+def timeline_events(events, months):
+    """The events of the last months of the history with the few columns the timeline shows."""
+    start = timeline_start(events, months)
+    window = events if start is None else events[events['event_date'] >= start]
+    return pd.DataFrame({
+        'event_date': window['event_date'],
+        'artists_str': window['artists'].map(lambda x: ", ".join(x) if isinstance(x, (list, tuple)) else str(x)),
+        'location': window['location'],
+    })
+
+@profiled
+def monthly_counts(events, months):
+    """Events per month within the last months of the history, for zoomed-out timelines."""
+    start = timeline_start(events, months)
+    window = events if start is None else events[events['event_date'] >= start]
+    counts = window.groupby(window['event_date'].dt.to_period('M')).size()
+    return pd.DataFrame({'month': counts.index.to_timestamp(), 'events': counts.to_numpy()})
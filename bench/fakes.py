@@ -0,0 +1,320 @@
+"""Local stand-ins for setlist.fm, Spotify and Supabase (PostgREST) used by the benchmarks."""
+import json
+import random
+import re
+import threading
+from collections import Counter
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, unquote_plus, urlsplit
+
+# Tables not listed here get a generated "id" column
+PRIMARY_KEYS = {
+    "Setlist": ("id",),
+    "SpotifyArtist": ("artist_name",),
+    "SyncState": ("id",),
+    "Song": ("setlist_id", "position"),
+    "Location": ("city_name", "country_name", "venue_name"),
+}
+# Columns with a lookup index, so eq/in filters on them don't scan the whole table
+INDEXED_COLUMNS = {"Song": "setlist_id"}
+
+
+def synthetic_setlists(count, seed=0):
+    """Returns count setlist.fm setlist payloads with a realistic amount of repetition."""
+    rng = random.Random(seed)
+    artists = [f"Artist {i}" for i in range(max(10, count // 25))]
+    cities = [(f"City {i}", f"Country {i % 12}", 45 + rng.random() * 10, 5 + rng.random() * 10) for i in range(max(5, count // 200))]
+    venues = [(f"Venue {i}", rng.choice(cities)) for i in range(max(5, count // 40))]
+    start = date(2000, 1, 1)
+
+    setlists = []
+    for i in range(count):
+        venue, (city, country, lat, long) = rng.choice(venues)
+        event_date = start + timedelta(days=rng.randrange(9000))
+        songs = [{"name": f"Song {rng.randrange(400)}"} for _ in range(rng.randrange(0, 20))]
+        setlists.append({
+            "id": f"{i:08x}",
+            "eventDate": event_date.strftime("%d-%m-%Y"),
+            "lastUpdated": "2020-01-01T00:00:00.000+0000",
+            "artist": {"mbid": str(i), "name": rng.choice(artists)},
+            "venue": {
+                "id": venue,
+                "name": venue,
+                "city": {"name": city, "coords": {"lat": lat, "long": long}, "country": {"code": "XX", "name": country}},
+            },
+            "tour": {"name": "Tour"},
+            "sets": {"set": [{"song": songs}]},
+            "url": f"https://www.setlist.fm/setlist/{i:08x}.html",
+        })
+    return setlists
+
+
+def upcoming_html(count):
+    """HTML of an attended page with count upcoming concerts."""
+    entries = "".join(
+        f"""<li class="setlist"><span class="smallDateBlock"><span>Jan</span><span>{(i % 28) + 1:02d}</span><span>2030</span></span>
+        <div class="content"><a href="./setlist/upcoming-{i}.html"><strong>Artist {i}</strong></a>
+        <span class="subline"><span>Venue {i}, City {i}, Country</span></span></div></li>"""
+        for i in range(count)
+    )
+    return f"<html><body><div class='other'>x</div><div class='userAttendancesAndNote'><ul>{entries}</ul></div></body></html>"
+
+
+class FakeState:
+    """Data and request counters shared by all fake servers."""
+
+    def __init__(self, setlists, upcoming=10, items_per_page=20):
+        self.setlists = setlists
+        self.upcoming = upcoming
+        self.items_per_page = items_per_page
+        self.tables = {}
+        self.indexes = {}
+        self.next_id = 1
+        self.requests = Counter()
+        self.lock = threading.Lock()
+
+    def count(self, key):
+        with self.lock:
+            self.requests[key] += 1
+
+
+def parse_in_values(value):
+    """Splits the value list of an in.(...) filter, honouring double quotes."""
+    return [unquote(v[1:-1] if v.startswith('"') else v) for v in re.findall(r'"[^"]*"|[^,]+', value[1:-1])]
+
+
+def compile_filter(column, expression):
+    """Turns one PostgREST filter into a predicate on rows. Value lists are parsed once, not per row."""
+    operator, _, value = expression.partition(".")
+    if operator == "in":
+        values = set(parse_in_values(value))
+        return lambda row: str(row.get(column)) in values
+    if operator == "ilike":
+        pattern = re.compile(re.escape(value).replace(r"\*", ".*").replace("%", ".*"), re.IGNORECASE)
+        return lambda row: row.get(column) is not None and pattern.fullmatch(str(row.get(column))) is not None
+    if operator not in ("eq", "neq", "is", "gte", "lte", "gt", "lt"):
+        raise ValueError(f"Unsupported filter {expression}")
+    return lambda row: matches(row, column, expression)
+
+
+def matches(row, column, expression):
+    operator, _, value = expression.partition(".")
+    field = row.get(column)
+    if operator == "eq":
+        return str(field) == value
+    if operator == "neq":
+        return str(field) != value
+    if operator == "is":
+        return field is None if value == "null" else str(field).lower() == value
+    if field is None:
+        return False
+    if operator == "gte":
+        return str(field) >= value
+    if operator == "lte":
+        return str(field) <= value
+    if operator == "gt":
+        return str(field) > value
+    if operator == "lt":
+        return str(field) < value
+    raise ValueError(f"Unsupported filter {expression}")
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = None
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_body(self):
+        return json.loads(self.body) if self.body else None
+
+    def do_GET(self):
+        self.route("GET")
+
+    def do_POST(self):
+        self.route("POST")
+
+    def do_PATCH(self):
+        self.route("PATCH")
+
+    def do_DELETE(self):
+        self.route("DELETE")
+
+    def route(self, method):
+        # Always consume the body, keep-alive connections would otherwise read it as the next request
+        length = int(self.headers.get("Content-Length") or 0)
+        self.body = self.rfile.read(length) if length else b""
+        url = urlsplit(self.path)
+        query = parse_qs(url.query, keep_blank_values=True)
+        path = url.path
+
+        if path.startswith("/rest/1.0/user/"):
+            return self.setlistfm_page(query)
+        if path.startswith("/attended/"):
+            return self.attended_page()
+        if path == "/api/token":
+            self.state.count("spotify token")
+            return self.send_json(200, {"access_token": "token", "token_type": "Bearer", "expires_in": 3600})
+        if path == "/v1/search":
+            return self.spotify_search(query)
+        if path.startswith("/rest/v1/rpc/"):
+            self.state.count(f"supabase rpc {path.rsplit('/', 1)[-1]}")
+            return self.send_json(200, None)
+        if path.startswith("/rest/v1/"):
+            return self.postgrest(method, unquote(path[len("/rest/v1/"):]), url.query)
+        self.send_json(404, {"message": "not found"})
+
+    def setlistfm_page(self, query):
+        self.state.count("setlist.fm api")
+        page = int(query.get("p", ["1"])[0])
+        size = self.state.items_per_page
+        setlists = self.state.setlists[(page - 1) * size:page * size]
+        if not setlists:
+            return self.send_json(404, {"code": 404, "message": "not found"})
+        self.send_json(200, {"type": "setlists", "itemsPerPage": size, "page": page, "total": len(self.state.setlists), "setlist": setlists})
+
+    def attended_page(self):
+        self.state.count("setlist.fm html")
+        body = upcoming_html(self.state.upcoming).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def spotify_search(self, query):
+        self.state.count("spotify search")
+        artist = query.get("q", [""])[0].removeprefix("artist:")
+        items = [] if artist.endswith("7") else [{"id": f"sp-{artist}", "name": artist, "external_urls": {"spotify": f"https://open.spotify.com/artist/{artist}"}}]
+        self.send_json(200, {"artists": {"items": items, "total": len(items)}})
+
+    @staticmethod
+    def row_key(table, row):
+        return tuple(row.get(column) for column in PRIMARY_KEYS.get(table, ("id",)))
+
+    def index(self, table):
+        """{value: set of row keys} of the indexed column of a table."""
+        return self.state.indexes.setdefault(table, {})
+
+    def store_row(self, table, rows, row_key, row):
+        rows[row_key] = row
+        if table in INDEXED_COLUMNS:
+            self.index(table).setdefault(str(row.get(INDEXED_COLUMNS[table])), set()).add(row_key)
+
+    def drop_row(self, table, rows, row_key):
+        row = rows.pop(row_key, None)
+        if row is not None and table in INDEXED_COLUMNS:
+            self.index(table).get(str(row.get(INDEXED_COLUMNS[table])), set()).discard(row_key)
+
+    def candidates(self, table, rows, filters):
+        """Rows an eq/in filter on the indexed column can match, otherwise all rows."""
+        column = INDEXED_COLUMNS.get(table)
+        for key, value in filters:
+            operator, _, operand = value.partition(".")
+            if key == column and operator in ("eq", "in"):
+                values = parse_in_values(operand) if operator == "in" else [operand]
+                index = self.index(table)
+                row_keys = sorted(set().union(*(index.get(v, set()) for v in values)))
+                return [rows[row_key] for row_key in row_keys if row_key in rows]
+        return list(rows.values())
+
+    def postgrest(self, method, table, raw_query):
+        self.state.count(f"supabase {method} {table}")
+        params = [(key, unquote_plus(value)) for key, _, value in (part.partition("=") for part in raw_query.split("&") if part)]
+        prefer = self.headers.get("Prefer", "")
+
+        with self.state.lock:
+            if table not in self.state.tables and table not in PRIMARY_KEYS and table != "Upcoming" and method == "GET":
+                return self.send_json(404, {"code": "PGRST205", "message": f"Could not find the table 'public.{table}' in the schema cache"})
+            rows = self.state.tables.setdefault(table, {})
+
+            if method == "POST":
+                payload = self.read_body()
+                payload = payload if isinstance(payload, list) else [payload]
+                written = []
+                for row in payload:
+                    row = dict(row)
+                    if table not in PRIMARY_KEYS:
+                        row.setdefault("id", self.state.next_id)
+                        self.state.next_id += 1
+                    row_key = self.row_key(table, row)
+                    if row_key in rows and "merge-duplicates" in prefer:
+                        row = {**rows[row_key], **row}
+                    self.store_row(table, rows, row_key, row)
+                    written.append(row)
+                return self.send_json(201, written if "return=representation" in prefer else [])
+
+            select, order, limit, offset = "*", None, None, 0
+            filters = []
+            for key, value in params:
+                if key == "select":
+                    select = value
+                elif key == "order":
+                    order = value
+                elif key == "limit":
+                    limit = int(value)
+                elif key == "offset":
+                    offset = int(value)
+                else:
+                    filters.append((key, value))
+            predicates = [compile_filter(key, value) for key, value in filters]
+            selected = [row for row in self.candidates(table, rows, filters) if all(predicate(row) for predicate in predicates)]
+
+            if method == "DELETE":
+                for row in selected:
+                    self.drop_row(table, rows, self.row_key(table, row))
+                return self.send_json(200, selected if "return=representation" in prefer else [])
+
+            if method == "PATCH":
+                changes = self.read_body() or {}
+                updated = []
+                for row in selected:
+                    self.drop_row(table, rows, self.row_key(table, row))
+                    row = {**row, **changes}
+                    self.store_row(table, rows, self.row_key(table, row), row)
+                    updated.append(row)
+                return self.send_json(200, updated if "return=representation" in prefer else [])
+
+            if order:
+                # Stable sorts from the last order column to the first
+                for term in reversed(order.split(",")):
+                    column, _, direction = term.partition(".")
+                    selected.sort(key=lambda row: (row.get(column) is None, row.get(column)), reverse=direction.startswith("desc"))
+            total = len(selected)
+            range_header = self.headers.get("Range")
+            if range_header:
+                first, _, last = range_header.partition("-")
+                offset, limit = int(first), int(last) - int(first) + 1
+            # PostgREST caps unbounded reads at max-rows
+            limit = min(limit if limit is not None else 1000, 1000)
+            selected = selected[offset:offset + limit]
+            if select != "*":
+                columns = [column.strip() for column in select.split(",")]
+                selected = [{column: row.get(column) for column in columns} for row in selected]
+
+        headers = {}
+        if "count=exact" in prefer:
+            end = offset + len(selected) - 1
+            headers["Content-Range"] = f"{offset}-{end}/{total}" if selected else f"*/{total}"
+        self.send_json(200, selected, headers)
+
+
+def start_server(state, port=0):
+    """Starts all fakes on one local port in a background thread. Returns the server."""
+    handler = type("BoundHandler", (Handler,), {"state": state})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
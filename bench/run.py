@@ -0,0 +1,178 @@
+"""Benchmarks the sync job and the dashboard offline, against local stand-ins for
+setlist.fm, Spotify and Supabase (see fakes.py).
+
+    python bench/run.py                                # 100, 10k and 100k setlists
+    python bench/run.py --sizes 100 10000 --json bench_output.json
+
+For every dataset size the phases below run one after another against the same fake
+database. Each phase runs in its own subprocess, which reports its wall time and peak
+memory; request counts come from the fake servers.
+
+    sync_full           first sync into an empty database (SYNC_MODE=full)
+    sync_incremental    second sync, nothing changed on setlist.fm
+    dashboard           dashboard run reading from Supabase, then one filtered rerun
+    dashboard_snapshot  the same, reading the Parquet snapshot written by the sync
+"""
+import argparse
+import json
+import os
+import resource
+import runpy
+import subprocess
+import sys
+import tempfile
+import time
+
+from fakes import FakeState, start_server, synthetic_setlists
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PHASES = ["sync_full", "sync_incremental", "dashboard", "dashboard_snapshot"]
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def child_sync():
+    runpy.run_path(os.path.join(ROOT, "update_setlists.py"), run_name="__main__")
+    with open(os.environ["SYNC_REPORT_PATH"], encoding="utf-8") as f:
+        return {"report": json.load(f)}
+
+
+def child_dashboard():
+    from streamlit.testing.v1 import AppTest
+
+    # The app runs in this process, so its analytics calls report to this hook
+    import analytics
+    analytics_seconds = {}
+    analytics.profile_hooks.append(
+        lambda name, seconds: analytics_seconds.__setitem__(name, round(analytics_seconds.get(name, 0) + seconds, 4))
+    )
+
+    app = AppTest.from_file(os.path.join(ROOT, "streamlit_app.py"), default_timeout=600)
+    timings = {}
+
+    start = time.perf_counter()
+    app.run()
+    timings["first_run"] = round(time.perf_counter() - start, 3)
+
+    # Filtering by the first artist exercises the filtered query path
+    if app.multiselect and app.multiselect[0].options:
+        # AppTest cannot send back the state of an untouched segmented control, so its default is set explicitly
+        for control in app.button_group:
+            control.set_value([control.proto.options[i].content for i in control.proto.default])
+        start = time.perf_counter()
+        app.multiselect[0].select(app.multiselect[0].options[0]).run()
+        timings["filtered_run"] = round(time.perf_counter() - start, 3)
+
+    errors = [str(exception.value) for exception in app.exception]
+    return {"timings": timings, "analytics_seconds": analytics_seconds, "errors": errors}
+
+
+def run_child(kind):
+    # Like `python update_setlists.py` and `streamlit run`, make the repository modules importable
+    sys.path.insert(0, ROOT)
+    start = time.perf_counter()
+    result = child_sync() if kind == "sync" else child_dashboard()
+    result["wall_seconds"] = round(time.perf_counter() - start, 3)
+    result["peak_rss_mb"] = peak_rss_mb()
+    # The parent picks the result from the last line of stdout
+    print("BENCH " + json.dumps(result))
+
+
+def run_phase(phase, state, env, workdir):
+    state.requests.clear()
+    kind = "sync" if phase.startswith("sync") else "dashboard"
+    start = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", kind],
+        # Files the children write relative to their working directory stay out of the repository
+        env=env, cwd=workdir, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - start
+
+    lines = [line for line in process.stdout.splitlines() if line.startswith("BENCH ")]
+    if process.returncode != 0 or not lines:
+        print(process.stdout[-2000:], process.stderr[-2000:], sep="\n")
+        raise Exception(f"Benchmark phase {phase} failed with exit code {process.returncode}")
+
+    result = json.loads(lines[-1][len("BENCH "):])
+    result["process_seconds"] = round(wall, 3)
+    result["requests"] = dict(sorted(state.requests.items()))
+    return result
+
+
+def bench_size(size, args):
+    state = FakeState(synthetic_setlists(size), upcoming=args.upcoming)
+    server = start_server(state)
+    base = f"http://127.0.0.1:{server.server_port}"
+    workdir = tempfile.mkdtemp(prefix=f"bench-{size}-")
+    snapshot_dir = os.path.join(workdir, "snapshot")
+
+    env = dict(
+        os.environ,
+        SETLISTFM_API_KEY="bench",
+        SETLISTFM_USERNAME="bench",
+        SETLISTFM_API_URL=f"{base}/rest/1.0",
+        SETLISTFM_WEB_URL=base,
+        SETLISTFM_RATE=str(args.setlist_rate),
+        SPOTIFY_CLIENT_ID="bench",
+        SPOTIFY_CLIENT_SECRET="bench",
+        SPOTIFY_API_URL=f"{base}/v1/",
+        SPOTIFY_TOKEN_URL=f"{base}/api/token",
+        SUPABASE_URL=base,
+        SUPABASE_API_KEY="bench.bench.bench",
+        HTTP_CACHE_DIR=os.path.join(workdir, "http"),
+        SYNC_REPORT_PATH=os.path.join(workdir, "sync-report.json"),
+        SNAPSHOT_DIR=snapshot_dir,
+        PYTHONPATH=os.pathsep.join(filter(None, [os.path.join(ROOT, "bench"), os.environ.get("PYTHONPATH")])),
+    )
+
+    results = {}
+    try:
+        for phase in PHASES:
+            phase_env = dict(env)
+            if phase == "sync_full":
+                phase_env["SYNC_MODE"] = "full"
+            if phase == "dashboard":
+                # No snapshot there, so the dashboard reads from Supabase
+                phase_env["SNAPSHOT_DIR"] = os.path.join(workdir, "no-snapshot")
+            results[phase] = run_phase(phase, state, phase_env, workdir)
+            print_result(size, phase, results[phase])
+    finally:
+        server.shutdown()
+    return results
+
+
+def print_result(size, phase, result):
+    requests = sum(result["requests"].values())
+    print(f"{size:>7} {phase:<19} {result['wall_seconds']:>8.2f}s {result['peak_rss_mb']:>8.1f} MB {requests:>7} requests")
+    for name, seconds in result.get("timings", {}).items():
+        print(f"{'':>7}   {name:<17} {seconds:>8.2f}s")
+    for error in result.get("errors", []):
+        print(f"{'':>7}   error: {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks update_setlists.py and streamlit_app.py against local fakes.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 10_000, 100_000], help="numbers of setlists")
+    parser.add_argument("--upcoming", type=int, default=20, help="number of upcoming concerts")
+    parser.add_argument("--setlist-rate", type=float, default=1000, help="setlist.fm requests per second allowed by the sync")
+    parser.add_argument("--json", help="write all results to this file")
+    parser.add_argument("--child", choices=["sync", "dashboard"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return run_child(args.child)
+
+    print(f"{'size':>7} {'phase':<19} {'wall':>9} {'peak RSS':>11} {'requests':>16}")
+    results = {size: bench_size(size, args) for size in args.sizes}
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,21 @@
+import hashlib
+import json
 import os
+from datetime import datetime, timedelta, timezone
 import pandas as pd
+import pyarrow.parquet as pq
 import streamlit as st
 import altair as alt
+import pydeck as pdk
 from supabase import create_client, Client
 import spotipy
 from spotipy.oauth2 import SpotifyClientCredentials
+from supabase_reader import read_rows
+from analytics import (
+    FILTER_COLUMNS, EVENT_KEYS, UPCOMING_EVENT_KEYS, normalize_concerts, filter_concerts, options_from_concerts,
+    group_events, add_location, latest_first_timer, next_concert, count_by, yearly_counts, location_points,
+    cluster_locations, song_occurrences, timeline_events, monthly_counts,
+)
 
 
 SUPABASE_URL = os.environ["SUPABASE_URL"]
@@ -26,450 +37,651 @@ st.title("Meine Konzerte 🎵")
 st.set_page_config(layout="wide")
 
 # --- Fetch data ---
-def get_setlists():
-    response = supabase.table("Setlist").select("*").execute()
+# Without a version stamp: the daily sync runs at 06:00 UTC, data is assumed fresh an hour later
+SYNC_HOUR_UTC = 7
+
+def last_sync_slot():
+    """Start of the current daily sync window, the fallback data version."""
+    now = datetime.now(timezone.utc)
+    slot = now.replace(hour=SYNC_HOUR_UTC, minute=0, second=0, microsecond=0)
+    if now < slot:
+        slot -= timedelta(days=1)
+    return slot.isoformat()
+
+# Parquet snapshots written by update_setlists.export_snapshot, used instead of Supabase when present
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR", "snapshot")
+
+def snapshot_path(table):
+    return os.path.join(SNAPSHOT_DIR, f"{table}.parquet")
+
+def has_snapshot():
+    return os.path.exists(snapshot_path("Setlist"))
+
+@st.cache_data(ttl=timedelta(minutes=1), show_spinner=False)
+def get_data_version():
+    """Version stamp bumped by the sync job after each run (see update_setlists.bump_data_version).
+
+    All loaders take it as cache key, so every server process reloads once per sync.
+    With a local snapshot, its modification time is the version.
+    """
+    if has_snapshot():
+        return datetime.fromtimestamp(os.path.getmtime(snapshot_path("Setlist")), timezone.utc).isoformat()
+    try:
+        response = supabase.table("SyncState").select("version").eq("id", 1).limit(1).execute()
+        if response.data:
+            return response.data[0]["version"]
+    except Exception:
+        pass
+    return last_sync_slot()
+
+# Loaders below use st.cache_resource: the frames are shared by all sessions of the
+# server process and must be treated as read-only, sessions only derive new frames.
+
+# Only the flat columns used by the views, the raw setlist.fm payload is loaded per concert
+SETLIST_COLUMNS = "id, artist_name, venue_name, city_name, city_lat, city_long, country_name, event_date, url"
+UPCOMING_COLUMNS = "artist_name, venue_name, city_name, country_name, event_date, url"
+
+def apply_filters(query, filters):
+    """Translates the dashboard filters into in/gte/lte conditions of a Supabase query."""
+    for column in FILTER_COLUMNS.values():
+        if filters.get(column):
+            query = query.in_(column, list(filters[column]))
+    first_year, last_year = filters['years']
+    return query.gte("event_date", f"{first_year}-01-01").lte("event_date", f"{last_year}-12-31")
+
+@st.cache_resource(ttl=timedelta(days=1), max_entries=4, show_spinner="Lade Snapshot...")
+def load_snapshot(data_version, table):
+    """Reads a memory-mapped Parquet snapshot of a table, empty if the file does not exist."""
+    if not os.path.exists(snapshot_path(table)):
+        return pd.DataFrame()
+    return normalize_concerts(pq.read_table(snapshot_path(table), memory_map=True).to_pandas())
+
+@st.cache_resource(ttl=timedelta(days=1), max_entries=32, show_spinner="Lade Konzerte...")
+def get_setlists(data_version, filters):
+    """Loads the setlists matching the filters. Filters run in Supabase, or in pandas for a local snapshot."""
+    if has_snapshot():
+        return filter_concerts(load_snapshot(data_version, "Setlist"), filters)
+    rows = read_rows(supabase, "Setlist", SETLIST_COLUMNS, where=lambda query: apply_filters(query, filters))
+    return normalize_concerts(pd.DataFrame(rows))
+
+@st.cache_resource(ttl=timedelta(days=1), max_entries=2, show_spinner=False)
+def get_filter_options(data_version):
+    """Distinct artists, venues, cities, countries and years for the filter widgets."""
+    if has_snapshot():
+        result = options_from_concerts(load_snapshot(data_version, "Setlist"))
+    else:
+        try:
+            options = pd.DataFrame(read_rows(supabase, "FilterOptions", "dimension, name", order=("dimension", "name")))
+        except Exception:
+            options = pd.DataFrame()
+
+        if options.empty:
+            # FilterOptions view not available yet, derive the options from the setlists
+            rows = read_rows(supabase, "Setlist", ", ".join([*FILTER_COLUMNS.values(), "event_date"]))
+            result = options_from_concerts(normalize_concerts(pd.DataFrame(rows)))
+        else:
+            result = {dimension: sorted(names['name'].tolist()) for dimension, names in options.groupby('dimension')}
+
+    result['year'] = sorted(int(year) for year in result.get('year', []))
+    return result
+
+@st.cache_resource(ttl=timedelta(days=1), max_entries=2, show_spinner="Lade kommende Konzerte...")
+def get_upcoming(data_version):
+    if has_snapshot():
+        return load_snapshot(data_version, "Upcoming")
+    return normalize_concerts(pd.DataFrame(read_rows(supabase, "Upcoming", UPCOMING_COLUMNS)))
+
+@st.cache_data(ttl=timedelta(days=1), max_entries=100, show_spinner=False)
+def get_setlist_raw(data_version, setlist_id):
+    """Loads the raw setlist.fm payload of a single concert for the detail view."""
+    response = supabase.table("Setlist").select("raw").eq("id", setlist_id).limit(1).execute()
+    return response.data[0]["raw"] if response.data else None
+
+# --- Precomputed aggregates, refreshed by the sync job (see update_setlists.refresh_stats) ---
+@st.cache_resource(ttl=timedelta(days=1), max_entries=2, show_spinner=False)
+def get_events(data_version):
+    """Events of the unfiltered history from the ConcertEvent view, empty if it is not available."""
+    if has_snapshot():
+        return pd.DataFrame()
+    try:
+        rows = read_rows(supabase, "ConcertEvent", order=EVENT_KEYS)
+    except Exception:
+        return pd.DataFrame()
+    events = normalize_concerts(pd.DataFrame(rows))
+    return events if events.empty else add_location(events)
+
+@st.cache_resource(ttl=timedelta(days=1), max_entries=2, show_spinner=False)
+def get_stats(data_version):
+    """Attendances per dimension and name from the ConcertStats view, empty if it is not available."""
+    if has_snapshot():
+        return pd.DataFrame()
+    try:
+        rows = read_rows(supabase, "ConcertStats", order=("dimension", "name"))
+    except Exception:
+        return pd.DataFrame()
+    return pd.DataFrame(rows)
+
+@st.cache_resource(ttl=timedelta(days=1), max_entries=2, show_spinner=False)
+def get_map_locations(data_version):
+    """Events per venue with corrected coordinates from the MapLocation view, empty if it is not available."""
+    if has_snapshot():
+        return pd.DataFrame()
+    try:
+        # The view groups by the effective coordinates too, only all five columns are unique
+        rows = read_rows(supabase, "MapLocation", order=("city_name", "country_name", "venue_name", "latitude", "longitude"))
+    except Exception:
+        return pd.DataFrame()
+    return pd.DataFrame(rows)
+
+# --- Map ---
+MAP_ZOOM_LEVELS = list(range(2, 13))
+MAP_DEFAULT_ZOOM = 5
+
+def map_deck(clusters, zoom):
+    """pydeck map with one scalable marker per cluster, centered on the busiest cluster."""
+    center = clusters.sort_values('events', ascending=False).iloc[0]
+    layer = pdk.Layer(
+        "ScatterplotLayer",
+        data=clusters,
+        get_position=['longitude', 'latitude'],
+        get_radius='radius',
+        radius_units='pixels',
+        get_fill_color=[255, 107, 107, 180],
+        stroked=True,
+        get_line_color=[255, 255, 255],
+        line_width_min_pixels=1,
+        pickable=True,
+    )
+    view = pdk.ViewState(latitude=float(center['latitude']), longitude=float(center['longitude']), zoom=zoom)
+    return pdk.Deck(layers=[layer], initial_view_state=view, tooltip={"text": "{label}\n{events} Konzerte"})
+
+# --- Timeline ---
+# Windows ending at the latest event; longer ones than TIMELINE_DETAIL_MONTHS show events per month
+TIMELINE_WINDOWS = {"6 Monate": 6, "1 Jahr": 12, "3 Jahre": 36, "Alle": None}
+TIMELINE_DEFAULT_WINDOW = "6 Monate"
+TIMELINE_DETAIL_MONTHS = 12
+
+@st.cache_resource(ttl=timedelta(days=1), max_entries=64, show_spinner=False)
+def get_timeline_spec(data_version, key, window, _events):
+    """Vega-Lite spec of the timeline for one filter_key() and window.
+
+    Only the events of the window are embedded (one dataset shared by bars and labels),
+    long windows get one bar per month instead.
+    """
+    months = TIMELINE_WINDOWS[window]
+    if months is None or months > TIMELINE_DETAIL_MONTHS:
+        data = monthly_counts(_events, months)
+        chart = alt.Chart(data).mark_bar(color='#1f77b4').encode(
+            x=alt.X('month:T', title='Monat', axis=alt.Axis(format='%m.%Y', labelAngle=0)),
+            y=alt.Y('events:Q', title='Konzerte', axis=alt.Axis(tickMinStep=1)),
+            tooltip=[
+                alt.Tooltip('month:T', title='Monat', format='%m.%Y'),
+                alt.Tooltip('events:Q', title='Konzerte'),
+            ],
+        )
+        return chart.properties(height=350).interactive(bind_y=False).to_dict()
+
+    data = timeline_events(_events, months)
+    base = alt.Chart(data).encode(
+        x=alt.X('event_date:T', title='Datum', axis=alt.Axis(format='%d.%m.%Y', labelAngle=0, tickCount='week', grid=True)),
+        y=alt.value(150),
+    )
+    bars = base.mark_bar(size=10, color='#1f77b4').encode(
+        tooltip=[
+            alt.Tooltip('event_date:T', title='Datum', format='%d.%m.%Y'),
+            alt.Tooltip('artists_str:N', title='Künstler'),
+            alt.Tooltip('location:N', title='Location'),
+        ]
+    )
+    # Labels above bars (artists), rotated 45 degrees to the right
+    labels = base.mark_text(align='left', baseline='middle', color='#1f77b4', fontSize=14, fontWeight='bold', dy=-15, dx=5).encode(
+        text=alt.Text('artists_str:N'),
+        angle=alt.value(-45),
+    )
+    return alt.layer(bars, labels).properties(height=350).interactive(bind_y=False).to_dict()
+
+# --- Concert lists ---
+CONCERT_LIST_PAGE_SIZE = 25
+CONCERT_LIST_OPEN = (
+    "<div style='height: 600px; overflow-y: auto; border: 1px solid #25282d; border-radius: 8px; padding: 12px;'>"
+    "<style>a { color: #1f77b4; text-decoration: none; } a:visited { color: #1f77b4; } a:hover { text-decoration: underline; }</style>"
+)
+
+def concert_card_html(event_date, artists, urls, location):
+    """HTML of one event in a concert list: date block, linked artists and location."""
+    artists = artists if isinstance(artists, (list, tuple)) else [artists]
+    urls = urls if isinstance(urls, (list, tuple)) else []
+
+    # Create artist links
+    artists_str = ", ".join(
+        f"<a href='{urls[i]}' target='_blank'>{artist}</a>" if i < len(urls) and pd.notna(urls[i]) else str(artist)
+        for i, artist in enumerate(artists)
+    )
+
+    return f"""
+    <div style='display: flex; align-items: center; padding: 8px 0; border-bottom: 1px solid #25282d;'>
+        <div style='text-align: center; margin-right: 16px; min-width: 45px;'>
+            <div style='color: #888; font-size: 10px;'>{event_date.strftime("%b").upper()}</div>
+            <div style='font-size: 20px; font-weight: bold;'>{event_date.strftime("%d")}</div>
+            <div style='color: #888; font-size: 10px;'>{event_date.strftime("%Y")}</div>
+        </div>
+        <div style='flex: 1;'>
+            <div style='font-size: 15px; font-weight: bold; margin-bottom: 2px;'>{artists_str}</div>
+            <div style='color: #888; font-size: 13px;'>{location}</div>
+        </div>
+    </div>
+    """
+
+def show_more(state_key, version, visible):
+    st.session_state[state_key] = (version, visible + CONCERT_LIST_PAGE_SIZE)
+
+def render_concert_list(events, key, version=None):
+    """Renders the first pages of an event list, 'Mehr laden' appends the next page.
+
+    The pages loaded belong to one version of the list (e.g. a filter_key()); a new
+    version starts again with the first page.
+    """
+    state_key = f"{key}_visible"
+    loaded_version, visible = st.session_state.get(state_key, (version, CONCERT_LIST_PAGE_SIZE))
+    if loaded_version != version:
+        visible = CONCERT_LIST_PAGE_SIZE
+    page = events.head(visible)
+
+    cards = [concert_card_html(row.event_date, row.artists, row.urls, row.location) for row in page.itertuples(index=False)]
+    st.html("".join([CONCERT_LIST_OPEN, *cards, "</div>"]))
+
+    if visible < len(events):
+        st.caption(f"{len(page)} von {len(events)} angezeigt")
+        st.button("Mehr laden", key=f"{key}_more", on_click=show_more, args=(state_key, version, visible))
+
+# --- Songs, read from the Song index the sync job builds from the raw setlists ---
+SONG_TOP_N = 25
+# Shorter terms can't use the trigram index and match most of the table
+SONG_SEARCH_MIN_LENGTH = 3
+SONG_SEARCH_LIMIT = 500
+
+@st.cache_resource(ttl=timedelta(days=1), max_entries=32, show_spinner=False)
+def get_top_songs(data_version, artists):
+    """Most heard songs from the SongStats view, optionally only of some artists. None if the view is not available."""
+    try:
+        query = supabase.table("SongStats").select("artist_name, song_name, times_heard, last_heard")
+        if artists:
+            query = query.in_("artist_name", list(artists))
+        response = query.order("times_heard", desc=True).order("song_name").limit(SONG_TOP_N).execute()
+    except Exception:
+        return None
     return pd.DataFrame(response.data)
 
-def get_upcoming():
-    response = supabase.table("Upcoming").select("*").execute()
+@st.cache_data(ttl=timedelta(days=1), max_entries=100, show_spinner="Suche Songs...")
+def search_songs(data_version, term, artists):
+    """Up to SONG_SEARCH_LIMIT song rows whose name contains the term (case-insensitive), optionally only of some artists.
+
+    Tapes are left out like in SongStats. None if the Song table is not available.
+    """
+    # % and * are wildcards in PostgREST's ilike
+    pattern = "%" + term.replace("%", "").replace("*", "") + "%"
+    try:
+        query = supabase.table("Song").select("setlist_id, position, song_name, cover_artist, tape").ilike("song_name", pattern).is_("tape", "false")
+        if artists:
+            query = query.in_("artist_name", list(artists))
+        response = query.order("setlist_id").order("position").limit(SONG_SEARCH_LIMIT).execute()
+    except Exception:
+        return None
     return pd.DataFrame(response.data)
 
-df = get_setlists()
-upcoming_raw = get_upcoming()
+# --- Sections ---
+# Every section caches its computations per data version and filter_key(), so a filter change
+# only recomputes what depends on the filters, once per filter state. Sections with their own
+# widgets are fragments: using a widget reruns only that section, not the whole script.
+
+def filter_key(filters):
+    """Short stable hash of a filter state, the cache key of everything derived from the filtered concerts."""
+    return hashlib.sha1(json.dumps(filters, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+@st.cache_resource(ttl=timedelta(days=1), max_entries=32, show_spinner=False)
+def get_filtered_events(data_version, key, unfiltered, _concerts):
+    """Events of the filtered concerts, newest first. Unfiltered they come from the ConcertEvent view."""
+    events = get_events(data_version) if unfiltered else pd.DataFrame()
+    # Group by date and location, separate artists and links
+    if events.empty:
+        events = group_events(_concerts, EVENT_KEYS)
+    return events.sort_values("event_date", ascending=False)
+
+@st.cache_resource(ttl=timedelta(days=1), max_entries=32, show_spinner=False)
+def get_counts(data_version, key, unfiltered, _concerts, _events):
+    """Top-N tables and concerts per year of one filter state. Unfiltered they come from the ConcertStats view."""
+    stats = get_stats(data_version) if unfiltered else pd.DataFrame()
+    stats = None if stats.empty else stats
+    return {
+        'artist': count_by(_concerts, 'artist_name', stats, 'artist'),
+        'venue': count_by(_events, 'venue_name', stats, 'venue'),
+        'city': count_by(_events, 'city_name', stats, 'city'),
+        'country': count_by(_events, 'country_name', stats, 'country'),
+        'year': yearly_counts(_events, stats),
+    }
+
+@st.cache_resource(ttl=timedelta(days=1), max_entries=32, show_spinner=False)
+def get_first_timer(data_version, key, _concerts):
+    return latest_first_timer(_concerts)
+
+@st.cache_resource(ttl=timedelta(days=1), max_entries=32, show_spinner=False)
+def get_detail_labels(data_version, key, _concerts):
+    """Select box labels of the filtered concerts by setlist id, newest first."""
+    rows = _concerts.sort_values('event_date', ascending=False)
+    return pd.Series(
+        [f"{row.event_date.strftime('%d.%m.%Y')} – {row.artist_name} – {row.venue_name}, {row.city_name}" for row in rows.itertuples()],
+        index=rows['id'],
+    )
+
+@st.cache_resource(ttl=timedelta(days=1), max_entries=32, show_spinner=False)
+def get_map_points(data_version, key, unfiltered, _events):
+    """Events per venue with coordinates. Unfiltered they come from the MapLocation view."""
+    points = get_map_locations(data_version) if unfiltered else pd.DataFrame()
+    if points.empty:
+        points = location_points(_events)
+    return points.dropna(subset=['latitude', 'longitude'])
+
+@st.cache_resource(ttl=timedelta(days=1), max_entries=64, show_spinner=False)
+def get_map_clusters(data_version, key, zoom, _points):
+    return cluster_locations(_points, zoom)
+
+# Upcoming concerts don't depend on the filters and are only recomputed for a new data version
+@st.cache_resource(ttl=timedelta(days=1), max_entries=2, show_spinner=False)
+def get_upcoming_events(data_version):
+    upcoming = get_upcoming(data_version)
+    if upcoming.empty:
+        return upcoming
+    return group_events(upcoming, UPCOMING_EVENT_KEYS).sort_values("event_date", ascending=True)
+
+@st.cache_resource(ttl=timedelta(days=1), max_entries=2, show_spinner=False)
+def get_next_concert(data_version):
+    return next_concert(get_upcoming(data_version))
+
+def highlight(title, headline, event_date, location):
+    st.markdown("<div style='font-size:14px; color:#888; margin-bottom:4px;'>{}</div><div style='font-size:22px; font-weight:bold; margin-bottom:12px;'>{}</div>".format(title, headline), unsafe_allow_html=True)
+    st.write(f"📅 {event_date.strftime('%d.%m.%Y')}")
+    st.write(f"📍 {location}")
+
+def highlights_section(data_version, key, concerts, events):
+    st.subheader("Highlights")
+    col_latest_concert, col_latest_artist, col_next_concert = st.columns(3)
+
+    # Latest concert
+    with col_latest_concert:
+        latest_concert = events.iloc[0]
+        artists_str = ", ".join(latest_concert['artists']) if isinstance(latest_concert['artists'], (list, tuple)) else str(latest_concert['artists'])
+        highlight("Letztes Konzert", artists_str, latest_concert['event_date'],
+                  f"{latest_concert['venue_name']}, {latest_concert['city_name']}, {latest_concert['country_name']}")
+
+    # Latest first-time artist (artist with only 1 appearance, most recent)
+    with col_latest_artist:
+        first_timer = get_first_timer(data_version, key, concerts)
+        if first_timer is not None:
+            highlight("Letzter neuer Künstler", first_timer['artist_name'], first_timer['event_date'],
+                      f"{first_timer['venue_name']}, {first_timer['city_name']}, {first_timer['country_name']}")
+        else:
+            st.info("Alle Künstler wurden bereits besucht.")
+
+    # Next upcoming concert
+    with col_next_concert:
+        next_event = get_next_concert(data_version)
+        if next_event is not None:
+            highlight("Nächstes Konzert", ", ".join(next_event['artists']), next_event['event_date'],
+                      f"{next_event['venue_name']}, {next_event['city_name']}, {next_event['country_name']}")
+        else:
+            st.info("Alle Künstler wurden bereits besucht.")
+
+@st.fragment
+def past_concerts_section(key, events):
+    st.subheader("Vergangene Konzerte")
+    # Use grouped events (one row per date+location) for counts
+    st.write(f"{len(events)} vergangene Konzerte")
+    render_concert_list(events, "past", key)
+
+@st.fragment
+def upcoming_concerts_section(data_version):
+    st.subheader("Kommende Konzerte")
+    upcoming = get_upcoming_events(data_version)
+    if upcoming.empty:
+        st.write("0 kommende Konzerte")
+        st.info("Keine kommenden Konzerte geplant.")
+    else:
+        st.write(f"{len(upcoming)} kommende Konzerte")
+        render_concert_list(upcoming, "upcoming", data_version)
+
+# --- Konzertdetails: raw setlist is only loaded for the selected concert ---
+# The select box only gets the newest matches of the search, not the whole history
+DETAIL_OPTIONS_LIMIT = 50
+
+@st.fragment
+def details_section(data_version, key, concerts):
+    st.subheader("Konzertdetails")
+    detail_labels = get_detail_labels(data_version, key, concerts)
+    detail_term = st.text_input("Konzert suchen:", placeholder="Artist, Venue, Stadt oder Datum").strip()
+    if detail_term:
+        detail_labels = detail_labels[detail_labels.str.contains(detail_term, case=False, regex=False)]
+    options = detail_labels.head(DETAIL_OPTIONS_LIMIT)
+    if len(options) < len(detail_labels):
+        st.caption(f"Die neuesten {len(options)} von {len(detail_labels)} Konzerten, Suche eingrenzen für ältere.")
+    selected_setlist = st.selectbox("Konzert:", options=list(options.index), format_func=options.get,
+                                    index=None, placeholder="Konzert auswählen")
+    if not selected_setlist:
+        return
+    raw = get_setlist_raw(data_version, selected_setlist)
+    if not raw:
+        st.info("Keine Details verfügbar.")
+        return
+
+    tour = raw.get('tour', {}).get('name')
+    if tour:
+        st.write(f"🎤 Tour: {tour}")
+    if raw.get('info'):
+        st.caption(raw['info'])
+
+    sets = raw.get('sets', {}).get('set', [])
+    if not any(s.get('song') for s in sets):
+        st.info("Keine Songs für dieses Konzert eingetragen.")
+    for s in sets:
+        songs = s.get('song', [])
+        if not songs:
+            continue
+        set_name = s.get('name') or (f"Zugabe {s['encore']}" if s.get('encore') else "Set")
+        lines = []
+        for i, song in enumerate(songs, start=1):
+            line = f"{i}. {song.get('name') or '—'}"
+            if song.get('cover'):
+                line += f" *({song['cover'].get('name')} Cover)*"
+            if song.get('tape'):
+                line += " *(Tape)*"
+            lines.append(line)
+        st.markdown(f"**{set_name}**\n\n" + "\n".join(lines))
+    st.markdown(f"[Auf setlist.fm ansehen]({raw.get('url')})")
+
+def top_table(data, column, title, label, empty_text):
+    """Top 3 of a count table as metrics side-by-side, the rest as a table."""
+    st.subheader(title)
+
+    top_n = min(3, len(data))
+    if top_n > 0:
+        st.caption("Top 3")
+        cols = st.columns(top_n)
+        for i, (_, row) in enumerate(data.head(top_n).iterrows()):
+            with cols[i]:
+                st.metric(label=str(row[column]), value=int(row['Attendances']))
+
+    # Remove top-3 from the table and show the rest with a caption
+    rest = data.iloc[top_n:]
+    st.caption("Andere")
+    if rest.empty:
+        st.info(empty_text)
+    else:
+        st.dataframe(rest, column_config={
+            column: label,
+            "Attendances": "Anzahl"
+        }, hide_index=True)
+
+def counts_section(counts):
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        top_table(counts['artist'], 'artist_name', "Konzerte pro Artist", "Artist", "Keine weiteren Künstler.")
+    with col2:
+        top_table(counts['venue'], 'venue_name', "Konzerte pro Venue", "Venue", "Keine weiteren Venues.")
+
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        top_table(counts['city'], 'city_name', "Konzerte pro Stadt", "Stadt", "Keine weiteren Städte.")
+    with col2:
+        top_table(counts['country'], 'country_name', "Konzerte pro Land", "Land", "Keine weiteren Länder.")
+
+@st.fragment
+def songs_section(data_version, artists, artist_filter_only, concerts):
+    st.subheader("Meistgehörte Songs")
+    col_top_songs, col_song_search = st.columns(2)
+
+    with col_top_songs:
+        top_songs = get_top_songs(data_version, artists)
+        if top_songs is None:
+            st.info("Songstatistik nicht verfügbar.")
+        elif top_songs.empty:
+            st.info("Keine Songs gefunden.")
+        else:
+            if not artist_filter_only:
+                st.caption("Zählt alle Konzerte, nur der Artist-Filter wird berücksichtigt.")
+            st.dataframe(top_songs, column_config={
+                "artist_name": "Artist",
+                "song_name": "Song",
+                "times_heard": "Anzahl",
+                "last_heard": st.column_config.DateColumn("Zuletzt gehört", format="DD.MM.YYYY"),
+            }, hide_index=True)
+
+    with col_song_search:
+        song_term = st.text_input("Song suchen:", placeholder="Songtitel").strip()
+        if song_term and len(song_term) < SONG_SEARCH_MIN_LENGTH:
+            st.caption(f"Mindestens {SONG_SEARCH_MIN_LENGTH} Zeichen eingeben.")
+        elif song_term:
+            songs = search_songs(data_version, song_term, artists)
+            if songs is None:
+                st.info("Songsuche nicht verfügbar.")
+            else:
+                occurrences = song_occurrences(songs, concerts)
+                if len(songs) >= SONG_SEARCH_LIMIT:
+                    st.caption(f"Nur die ersten {SONG_SEARCH_LIMIT} Treffer, für alle die Suche genauer fassen.")
+                st.write(f"{len(occurrences)}x gehört")
+                if not occurrences.empty:
+                    st.dataframe(occurrences[['event_date', 'song_name', 'artist_name', 'venue_name', 'city_name']], column_config={
+                        "event_date": st.column_config.DateColumn("Datum", format="DD.MM.YYYY"),
+                        "song_name": "Song",
+                        "artist_name": "Artist",
+                        "venue_name": "Venue",
+                        "city_name": "Stadt",
+                    }, hide_index=True)
 
-if df.empty:
+# --- Timeline: Alle Konzerte (initial letzte 6 Monate) ---
+@st.fragment
+def timeline_section(data_version, key, events):
+    st.subheader("Timeline: Alle Konzerte")
+    if events.empty:
+        st.info("Keine Konzerte verfügbar.")
+        return
+    timeline_window = st.segmented_control("Zeitraum:", options=list(TIMELINE_WINDOWS), default=TIMELINE_DEFAULT_WINDOW) or TIMELINE_DEFAULT_WINDOW
+    st.vega_lite_chart(get_timeline_spec(data_version, key, timeline_window, events), use_container_width=True)
+
+# --- Map: Concert Locations ---
+@st.fragment
+def map_section(data_version, key, unfiltered, events):
+    st.subheader("Karte")
+    map_points = get_map_points(data_version, key, unfiltered, events)
+    if map_points.empty:
+        st.info("Keine Koordinaten verfügbar für die Karte.")
+        return
+    # Nearby venues are merged into clusters that get finer with the zoom level
+    map_zoom = st.select_slider("Zoom:", options=MAP_ZOOM_LEVELS, value=MAP_DEFAULT_ZOOM)
+    st.pydeck_chart(map_deck(get_map_clusters(data_version, key, map_zoom, map_points), map_zoom))
+
+def refresh_data():
+    get_data_version.clear()
+    load_snapshot.clear()
+    get_setlists.clear()
+    get_filter_options.clear()
+    get_upcoming.clear()
+    get_setlist_raw.clear()
+    get_events.clear()
+    get_stats.clear()
+    get_top_songs.clear()
+    get_map_locations.clear()
+    get_timeline_spec.clear()
+    search_songs.clear()
+    get_filtered_events.clear()
+    get_counts.clear()
+    get_first_timer.clear()
+    get_detail_labels.clear()
+    get_map_points.clear()
+    get_map_clusters.clear()
+    get_upcoming_events.clear()
+    get_next_concert.clear()
+
+data_version = get_data_version()
+filter_options = get_filter_options(data_version)
+
+if not filter_options.get('year'):
     st.info("Keine Setlists gefunden")
 else:
-    # Datumsformat
-    df['event_date'] = pd.to_datetime(df['event_date'], errors='coerce')
-
     # --- Filters and Table Layout ---
     col1, col2 = st.columns([1, 5])
     
     with col1:
         st.subheader("Filter")
-        artists = st.multiselect("Artist:", options=df['artist_name'].dropna().unique())
-        venues = st.multiselect("Venue:", options=df['venue_name'].dropna().unique())
-        cities = st.multiselect("Stadt:", options=df['city_name'].dropna().unique())
-        countries = st.multiselect("Land:", options=df['country_name'].dropna().unique())
+        artists = st.multiselect("Artist:", options=filter_options.get('artist', []))
+        venues = st.multiselect("Venue:", options=filter_options.get('venue', []))
+        cities = st.multiselect("Stadt:", options=filter_options.get('city', []))
+        countries = st.multiselect("Land:", options=filter_options.get('country', []))
         
-        min_year = int(df['event_date'].dt.year.min())
-        max_year = int(df['event_date'].dt.year.max())
-        selected_years = st.slider("Jahr:", min_value=min_year, max_value=max_year, value=(min_year, max_year))
+        min_year = filter_options['year'][0]
+        max_year = filter_options['year'][-1]
+        if min_year < max_year:
+            selected_years = st.slider("Jahr:", min_value=min_year, max_value=max_year, value=(min_year, max_year))
+        else:
+            selected_years = (min_year, max_year)
+        st.button("Daten neu laden", on_click=refresh_data, help="Lädt die Konzerte neu aus der Datenbank.")
     
     with col2:
-        filtered = df
-        if artists:
-            filtered = filtered[filtered['artist_name'].isin(artists)]
-        if countries:
-            filtered = filtered[filtered['country_name'].isin(countries)]
-        if cities:
-            filtered = filtered[filtered['city_name'].isin(cities)]
-        if venues:
-            filtered = filtered[filtered['venue_name'].isin(venues)]
-
-        # Filter nach Jahr
-        filtered = filtered[(filtered['event_date'].dt.year >= selected_years[0]) &
-                            (filtered['event_date'].dt.year <= selected_years[1])]
+        filters = {
+            'artist_name': tuple(sorted(artists)),
+            'venue_name': tuple(sorted(venues)),
+            'city_name': tuple(sorted(cities)),
+            'country_name': tuple(sorted(countries)),
+            'years': tuple(selected_years),
+        }
+        key = filter_key(filters)
+        filtered = get_setlists(data_version, filters)
     
         # If filtering removed all rows, show a helpful message and an empty table
         if filtered.empty:
             st.info("Keine Konzerte für die gewählten Filter.")
         else:
-            # Group by date and location, separate artists and links
-            grouped_data = []
-            for (event_date, venue_name, city_name, city_lat, city_long, country_name), group in filtered.groupby(['event_date', 'venue_name', 'city_name', 'city_lat', 'city_long', 'country_name']):
-                # Separate artist names and create links
-                artists = []
-                urls = []
-                for _, row in group.iterrows():
-                    artist = row.get('artist_name')
-                    if artist:
-                        artists.append(artist)
-                    url = row.get('url')
-                    if url:
-                        urls.append(url) 
-
-                grouped_data.append({
-                    'event_date': event_date,
-                    'artists': artists,
-                    'urls': urls,
-                    'venue_name': venue_name,
-                    'city_name': city_name,
-                    'city_lat': city_lat,
-                    'city_long': city_long,
-                    'country_name': country_name
-                })
-
-            grouped_df = pd.DataFrame(grouped_data).sort_values("event_date", ascending=False)
-            # Combine venue, city, country into one location column
-            grouped_df['location'] = grouped_df.apply(lambda row: f"{row['venue_name']}, {row['city_name']}, {row['country_name']}", axis=1)
-
-            # --- Latest Concert and Latest First-Time Artist ---
-            st.subheader("Highlights")
-            col_latest_concert, col_latest_artist, col_next_concert = st.columns(3)
-
-            # Latest concert
-            with col_latest_concert:
-                latest_concert = grouped_df.iloc[0]
-                date_str = pd.to_datetime(latest_concert['event_date']).strftime("%d.%m.%Y")
-                artists_str = ", ".join(latest_concert['artists']) if isinstance(latest_concert['artists'], (list, tuple)) else str(latest_concert['artists'])
-                location_str = f"{latest_concert['venue_name']}, {latest_concert['city_name']}, {latest_concert['country_name']}"
-                st.markdown("<div style='font-size:14px; color:#888; margin-bottom:4px;'>Letztes Konzert</div><div style='font-size:22px; font-weight:bold; margin-bottom:12px;'>{}</div>".format(artists_str), unsafe_allow_html=True)
-                st.write(f"📅 {date_str}")
-                st.write(f"📍 {location_str}")
-
-            # Latest first-time artist (artist with only 1 appearance, most recent)
-            with col_latest_artist:
-                first_timers = filtered.groupby('artist_name').size().reset_index(name='count')
-                first_timers = first_timers[first_timers['count'] == 1]
-                if not first_timers.empty:
-                    # Get the most recent first-timer
-                    first_timer_names = first_timers['artist_name'].tolist()
-                    recent_first_timers = filtered[filtered['artist_name'].isin(first_timer_names)].sort_values('event_date', ascending=False)
-                    if not recent_first_timers.empty:
-                        latest_first_timer = recent_first_timers.iloc[0]
-                        date_str_ft = pd.to_datetime(latest_first_timer['event_date']).strftime("%d.%m.%Y")
-                        location_str = f"{latest_first_timer['venue_name']}, {latest_first_timer['city_name']}, {latest_first_timer['country_name']}"
-                        st.markdown("<div style='font-size:14px; color:#888; margin-bottom:4px;'>Letzter neuer Künstler</div><div style='font-size:22px; font-weight:bold; margin-bottom:12px;'>{}</div>".format(latest_first_timer['artist_name']), unsafe_allow_html=True)
-                        st.write(f"📅 {date_str_ft}")
-                        st.write(f"📍 {location_str}")
-                else:
-                    st.info("Alle Künstler wurden bereits besucht.")
-            
-            # Next upcoming concert
-            with col_next_concert:
-                if not upcoming_raw.empty:
-                    upcoming_raw['event_date'] = pd.to_datetime(upcoming_raw['event_date'], errors='coerce')
-                    upcoming_temp = upcoming_raw.sort_values('event_date', ascending=True)
-                    
-                    # Group to get the next concert
-                    next_event_date = upcoming_temp.iloc[0]['event_date']
-                    next_venue = upcoming_temp.iloc[0]['venue_name']
-                    next_city = upcoming_temp.iloc[0]['city_name']
-                    next_country = upcoming_temp.iloc[0]['country_name']
-                    
-                    # Get all artists for this event
-                    next_artists = upcoming_temp[
-                        (upcoming_temp['event_date'] == next_event_date) & 
-                        (upcoming_temp['venue_name'] == next_venue)
-                    ]['artist_name'].tolist()
-                    
-                    date_str_next = pd.to_datetime(next_event_date).strftime("%d.%m.%Y")
-                    artists_str_next = ", ".join(next_artists)
-                    location_str_next = f"{next_venue}, {next_city}, {next_country}"
-                    
-                    st.markdown("<div style='font-size:14px; color:#888; margin-bottom:4px;'>Nächstes Konzert</div><div style='font-size:22px; font-weight:bold; margin-bottom:12px;'>{}</div>".format(artists_str_next), unsafe_allow_html=True)
-                    st.write(f"📅 {date_str_next}")
-                    st.write(f"📍 {location_str_next}")
-                else:
-                    st.info("Alle Künstler wurden bereits besucht.")
+            # Without active filters, events and counts come from the views maintained by the sync job
+            unfiltered = not (artists or venues or cities or countries) and filters['years'] == (min_year, max_year)
+            grouped_df = get_filtered_events(data_version, key, unfiltered, filtered)
 
-            col_all_concerts, col_upcoming_concerts = st.columns(2)
+            highlights_section(data_version, key, filtered, grouped_df)
 
-            # All concerts table
+            col_all_concerts, col_upcoming_concerts = st.columns(2)
             with col_all_concerts:
-                st.subheader("Vergangene Konzerte")
-                # Use grouped events (one row per date+location) for counts
-                st.write(f"{len(grouped_df)} vergangene Konzerte")
-            
-                html = "<div style='height: 600px; overflow-y: auto; border: 1px solid #25282d; border-radius: 8px; padding: 12px;'>"
-                html += "<style>a { color: #1f77b4; text-decoration: none; } a:visited { color: #1f77b4; } a:hover { text-decoration: underline; }</style>"
-
-                for _, row in grouped_df.iterrows():
-                    event_date = pd.to_datetime(row['event_date'])
-                    month = event_date.strftime("%b").upper()
-                    day = event_date.strftime("%d")
-                    year = event_date.strftime("%Y")
-                    
-                    # Create artist links
-                    artists = row['artists'] if isinstance(row['artists'], (list, tuple)) else [row['artists']]
-                    urls = row['urls'] if isinstance(row['urls'], (list, tuple)) else []
-                    artist_links = []
-                    for i, artist in enumerate(artists):
-                        if i < len(urls) and pd.notna(urls[i]):
-                            artist_links.append(f"<a href='{urls[i]}' target='_blank'>{artist}</a>")
-                        else:
-                            artist_links.append(str(artist))
-                    artists_str = ", ".join(artist_links)
-                    
-                    location_str = f"{row['venue_name']}, {row['city_name']}, {row['country_name']}"
-
-                    html += f"""
-                    <div style='display: flex; align-items: center; padding: 8px 0; border-bottom: 1px solid #25282d;'>
-                        <div style='text-align: center; margin-right: 16px; min-width: 45px;'>
-                            <div style='color: #888; font-size: 10px;'>{month}</div>
-                            <div style='font-size: 20px; font-weight: bold;'>{day}</div>
-                            <div style='color: #888; font-size: 10px;'>{year}</div>
-                        </div>
-                        <div style='flex: 1;'>
-                            <div style='font-size: 15px; font-weight: bold; margin-bottom: 2px;'>{artists_str}</div>
-                            <div style='color: #888; font-size: 13px;'>{location_str}</div>
-                        </div>
-                    </div>
-                    """
-
-                html += "</div>"
-
-                st.html(html)
-
-            # Upcoming concerts table
+                past_concerts_section(key, grouped_df)
             with col_upcoming_concerts:
-                st.subheader("Kommende Konzerte")
-                
-                # Process upcoming concerts data
-                if upcoming_raw.empty:
-                    st.write("0 kommende Konzerte")
-                    st.info("Keine kommenden Konzerte geplant.")
-                else:
-                    upcoming_raw['event_date'] = pd.to_datetime(upcoming_raw['event_date'], errors='coerce')
-                    
-                    # Group by date and location
-                    upcoming_grouped_data = []
-                    for (event_date, venue_name, city_name, country_name), group in upcoming_raw.groupby(['event_date', 'venue_name', 'city_name', 'country_name']):
-                        artists = []
-                        urls = []
-                        for _, row in group.iterrows():
-                            artist = row.get('artist_name')
-                            if artist:
-                                artists.append(artist)
-                            url = row.get('url')
-                            if url:
-                                urls.append(url)
-                        
-                        upcoming_grouped_data.append({
-                            'event_date': event_date,
-                            'artists': artists,
-                            'urls': urls,
-                            'venue_name': venue_name,
-                            'city_name': city_name,
-                            'country_name': country_name
-                        })
-                    
-                    upcoming_df = pd.DataFrame(upcoming_grouped_data).sort_values("event_date", ascending=True)
-                    st.write(f"{len(upcoming_df)} kommende Konzerte")
-                    
-                    html = "<div style='height: 600px; overflow-y: auto; border: 1px solid #25282d; border-radius: 8px; padding: 12px;'>"
-                    html += "<style>a { color: #1f77b4; text-decoration: none; } a:visited { color: #1f77b4; } a:hover { text-decoration: underline; }</style>"
-
-                    for _, row in upcoming_df.iterrows():
-                        event_date = pd.to_datetime(row['event_date'])
-                        month = event_date.strftime("%b").upper()
-                        day = event_date.strftime("%d")
-                        year = event_date.strftime("%Y")
-                        
-                        # Create artist links
-                        artists = row['artists'] if isinstance(row['artists'], (list, tuple)) else [row['artists']]
-                        urls = row['urls'] if isinstance(row['urls'], (list, tuple)) else []
-                        artist_links = []
-                        for i, artist in enumerate(artists):
-                            if i < len(urls) and pd.notna(urls[i]):
-                                artist_links.append(f"<a href='{urls[i]}' target='_blank'>{artist}</a>")
-                            else:
-                                artist_links.append(str(artist))
-                        artists_str = ", ".join(artist_links)
-                        
-                        location_str = f"{row['venue_name']}, {row['city_name']}, {row['country_name']}"
-
-                        html += f"""
-                        <div style='display: flex; align-items: center; padding: 8px 0; border-bottom: 1px solid #25282d;'>
-                            <div style='text-align: center; margin-right: 16px; min-width: 45px;'>
-                                <div style='color: #888; font-size: 10px;'>{month}</div>
-                                <div style='font-size: 20px; font-weight: bold;'>{day}</div>
-                                <div style='color: #888; font-size: 10px;'>{year}</div>
-                            </div>
-                            <div style='flex: 1;'>
-                                <div style='font-size: 15px; font-weight: bold; margin-bottom: 2px;'>{artists_str}</div>
-                                <div style='color: #888; font-size: 13px;'>{location_str}</div>
-                            </div>
-                        </div>
-                        """
-
-                    html += "</div>"
-                    st.html(html)
-
-            col1, col2 = st.columns([1, 1])
-            with col1:
-               # --- Table: Anzahl Konzerte pro Artist ---
-                artist_data = filtered.groupby('artist_name').size().reset_index(name='Attendances').sort_values('Attendances', ascending=False)
-                st.subheader("Konzerte pro Artist")
-
-                # Top-3 as metrics side-by-side with caption
-                top_n = min(3, len(artist_data))
-                if top_n > 0:
-                    st.caption("Top 3")
-                    top3 = artist_data.head(top_n)
-                    cols = st.columns(top_n)
-                    for i, (_, row) in enumerate(top3.iterrows()):
-                        with cols[i]:
-                            st.metric(label=str(row['artist_name']), value=int(row['Attendances']))
-
-                # Remove top-3 from the table and show the rest with a caption
-                rest = artist_data.iloc[top_n:]
-                st.caption("Andere")
-                if rest.empty:
-                    st.info("Keine weiteren Künstler.")
-                else:
-                    st.dataframe(rest, column_config={
-                        "artist_name": "Artist",
-                        "Attendances": "Anzahl"
-                    }, hide_index=True)
+                upcoming_concerts_section(data_version)
 
-            with col2:
-                 # --- Table: Anzahl Konzerte pro Venue ---
-                venue_data = grouped_df.groupby('venue_name').size().reset_index(name='Attendances').sort_values('Attendances', ascending=False)
-                st.subheader("Konzerte pro Venue")
-
-                # Top-3 as metrics side-by-side with caption
-                top_n = min(3, len(venue_data))
-                if top_n > 0:
-                    st.caption("Top 3")
-                    top3 = venue_data.head(top_n)
-                    cols = st.columns(top_n)
-                    for i, (_, row) in enumerate(top3.iterrows()):
-                        with cols[i]:
-                            st.metric(label=str(row['venue_name']), value=int(row['Attendances']))
-
-                # Remove top-3 from the table and show the rest with a caption
-                rest = venue_data.iloc[top_n:]
-                st.caption("Andere")
-                if rest.empty:
-                    st.info("Keine weiteren Venues.")
-                else:
-                    st.dataframe(rest, column_config={
-                        "venue_name": "Artist",
-                        "Attendances": "Anzahl"
-                    }, hide_index=True)
-              
-            col1, col2 = st.columns([1, 1])
-
-            with col1:
-                # --- Table: Anzahl Konzerte pro Stadt ---
-                city_data = grouped_df.groupby('city_name').size().reset_index(name='Attendances').sort_values('Attendances', ascending=False)
-                st.subheader("Konzerte pro Stadt")
-
-                # Top-3 as metrics side-by-side with caption
-                top_n = min(3, len(city_data))
-                if top_n > 0:
-                    st.caption("Top 3")
-                    top3 = city_data.head(top_n)
-                    cols = st.columns(top_n)
-                    for i, (_, row) in enumerate(top3.iterrows()):
-                        with cols[i]:
-                            st.metric(label=str(row['city_name']), value=int(row['Attendances']))
-
-                # Remove top-3 from the table and show the rest with a caption
-                rest = city_data.iloc[top_n:]
-                st.caption("Andere")
-                if rest.empty:
-                    st.info("Keine weiteren Städte.")
-                else:
-                    st.dataframe(rest, column_config={
-                        "city_name": "Stadt",
-                        "Attendances": "Anzahl"
-                    }, hide_index=True)
+            details_section(data_version, key, filtered)
 
+            counts = get_counts(data_version, key, unfiltered, filtered, grouped_df)
+            counts_section(counts)
 
-            with col2:
-                # --- Table: Anzahl Konzerte pro Land ---
-                country_data = grouped_df.groupby('country_name').size().reset_index(name='Attendances').sort_values('Attendances', ascending=False)
-                st.subheader("Konzerte pro Land")
-
-                # Top-3 as metrics side-by-side with caption
-                top_n = min(3, len(country_data))
-                if top_n > 0:
-                    st.caption("Top 3")
-                    top3 = country_data.head(top_n)
-                    cols = st.columns(top_n)
-                    for i, (_, row) in enumerate(top3.iterrows()):
-                        with cols[i]:
-                            st.metric(label=str(row['country_name']), value=int(row['Attendances']))
-
-                # Remove top-3 from the table and show the rest with a caption
-                rest = country_data.iloc[top_n:]
-                st.caption("Andere")
-                if rest.empty:
-                    st.info("Keine weiteren Länder.")
-                else:
-                    st.dataframe(rest, column_config={
-                        "country_name": "Land",
-                        "Attendances": "Anzahl"
-                    }, hide_index=True)
+            artist_filter_only = not (venues or cities or countries) and filters['years'] == (min_year, max_year)
+            songs_section(data_version, filters['artist_name'], artist_filter_only, filtered)
 
             # --- Chart: Anzahl Konzerte pro Jahr ---
-            # Count unique events per year from grouped events
-            grouped_df['year'] = pd.to_datetime(grouped_df['event_date']).dt.year
-            chart_data = grouped_df.groupby('year').size().reset_index(name='Anzahl Konzerte')
             st.subheader("Konzerte pro Jahr")
-            st.bar_chart(chart_data.set_index('year')['Anzahl Konzerte'])
-
-            # --- Timeline: Alle Konzerte (initial letzte 6 Monate) ---
-            st.subheader("Timeline: Alle Konzerte")
-            timeline_df = grouped_df.copy()  # Alle Konzerte, nicht gefiltert
-            
-            if timeline_df.empty:
-                st.info("Keine Konzerte verfügbar.")
-            else:
-                # Prepare display fields
-                timeline_df['artists_str'] = timeline_df['artists'].apply(lambda x: ", ".join(x) if isinstance(x, (list, tuple)) else (str(x) if pd.notna(x) else ""))
-                timeline_df['artist_count'] = timeline_df['artists'].apply(lambda x: len(x) if isinstance(x, (list, tuple)) else 1)
-                timeline_df['date_label'] = timeline_df['event_date'].dt.strftime('%d.%m.%Y')
-                timeline_df['y_pos'] = 0.3  # Balken in der unteren Hälfte
-                timeline_df['y_label'] = 0.33  # Labels näher an Balken
-
-                # Calculate domain for x-axis: show last 6 months initially
-                six_months_ago = pd.Timestamp.now() - pd.DateOffset(months=6)
-                x_scale_domain = [six_months_ago, pd.Timestamp.now()]
-
-                # Build Altair timeline: bars with integrated labels (horizontal scroll only)
-                bars = alt.Chart(timeline_df).mark_bar(size=10).encode(
-                    x=alt.X('event_date:T', title='Datum', scale=alt.Scale(domain=x_scale_domain), axis=alt.Axis(format='%d.%m.%Y', labelAngle=0, tickCount='week', grid=True)),
-                    y=alt.value(150),
-                    color=alt.value('#1f77b4'),
-                    tooltip=[
-                        alt.Tooltip('event_date:T', title='Datum'),
-                        alt.Tooltip('artists_str:N', title='Künstler'),
-                        alt.Tooltip('location:N', title='Location'),
-                        alt.Tooltip('setlist:N', title='Setlist')
-                    ]
-                )
-
-                # Labels above bars (artists), rotated 45 degrees to the right
-                labels = alt.Chart(timeline_df).mark_text(align='left', baseline='middle', color='#1f77b4', fontSize=14, fontWeight='bold', dy=-15, dx=5).encode(
-                    x=alt.X('event_date:T', title='Datum', scale=alt.Scale(domain=x_scale_domain)),
-                    y=alt.value(150),
-                    text=alt.Text('artists_str:N'),
-                    angle=alt.value(-45)
-                )
-
-                chart = alt.layer(bars, labels).properties(height=350).interactive()
-
-                st.altair_chart(chart, use_container_width=True)
-
-            # --- Map: Concert Locations ---
-            st.subheader("Karte")
-            
-            # Group by city and get lat/long and count
-            city_map_data = grouped_df.groupby('city_name').agg({
-                'city_lat': 'first',
-                'city_long': 'first'
-            }).reset_index()
-            
-            # Count events per city from grouped_df
-            city_counts = grouped_df.groupby('city_name').size().reset_index(name='count')
-            city_map_data = city_map_data.merge(city_counts, on='city_name', how='left')
-            
-            # Prepare data for map: rename to latitude/longitude for st.map()
-            map_data = city_map_data.rename(columns={
-                'city_lat': 'latitude',
-                'city_long': 'longitude',
-                'count': 'size'
-            })
-            
-            # Scale the size for better visualization (multiply by a factor)
-            map_data['size'] = map_data['size'] * 50
-            
-            if not map_data.empty:
-                st.map(map_data, size='size', color='#FF6B6B')
-            else:
-                st.info("Keine Koordinaten verfügbar für die Karte.")
\ No newline at end of file
+            st.bar_chart(counts['year'].set_index('year')['Anzahl Konzerte'])
+
+            timeline_section(data_version, key, grouped_df)
+            map_section(data_version, key, unfiltered, grouped_df)
\ No newline at end of file
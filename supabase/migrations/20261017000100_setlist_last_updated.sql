@@ -0,0 +1,3 @@
+-- setlist.fm "lastUpdated" stamp of the stored copy, used by the incremental sync
+-- to skip setlists that have not changed. Kept as text so it compares verbatim.
+alter table "Setlist" add column if not exists last_updated text;
@@ -0,0 +1,8 @@
+-- Spotify artist lookups cached by the sync job. Rows with a null spotify_id
+-- record that Spotify had no match (negative cache entries).
+create table if not exists "SpotifyArtist" (
+    artist_name text primary key,
+    spotify_id text,
+    spotify_url text,
+    fetched_at timestamptz not null default now()
+);
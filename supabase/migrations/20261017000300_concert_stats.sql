@@ -0,0 +1,48 @@
+-- Aggregates behind the unfiltered dashboard, rebuilt once per day by the sync
+-- job through refresh_concert_stats().
+
+-- One row per event (date + location), like group_events() in streamlit_app.py.
+-- Rows with a missing key column are left out, as pandas' groupby does.
+create materialized view if not exists "ConcertEvent" as
+select
+    event_date,
+    venue_name,
+    city_name,
+    city_lat,
+    city_long,
+    country_name,
+    array_agg(artist_name order by id) as artists,
+    array_agg(url order by id) as urls
+from "Setlist"
+where artist_name is not null
+  and event_date is not null
+  and venue_name is not null
+  and city_name is not null
+  and city_lat is not null
+  and city_long is not null
+  and country_name is not null
+group by event_date, venue_name, city_name, city_lat, city_long, country_name;
+
+-- Attendances per artist (counted per setlist) and per venue, city, country
+-- and year (counted per event).
+create materialized view if not exists "ConcertStats" as
+select 'artist' as dimension, artist_name as name, count(*) as attendances
+from "Setlist" where artist_name is not null group by artist_name
+union all
+select 'venue', venue_name, count(*) from "ConcertEvent" group by venue_name
+union all
+select 'city', city_name, count(*) from "ConcertEvent" group by city_name
+union all
+select 'country', country_name, count(*) from "ConcertEvent" group by country_name
+union all
+select 'year', extract(year from event_date)::int::text, count(*) from "ConcertEvent" group by 2;
+
+grant select on "ConcertEvent", "ConcertStats" to anon, authenticated;
+
+create or replace function refresh_concert_stats() returns void
+language plpgsql security definer as $$
+begin
+    refresh materialized view "ConcertEvent";
+    refresh materialized view "ConcertStats";
+end;
+$$;
@@ -0,0 +1,30 @@
+-- Indexes behind the dashboard filters, which are applied in Supabase as
+-- in (...) conditions on the name columns and a range on event_date.
+create index if not exists setlist_event_date_idx on "Setlist" (event_date);
+create index if not exists setlist_artist_name_idx on "Setlist" (artist_name);
+create index if not exists setlist_venue_name_idx on "Setlist" (venue_name);
+create index if not exists setlist_city_name_idx on "Setlist" (city_name);
+create index if not exists setlist_country_name_idx on "Setlist" (country_name);
+
+-- Distinct values for the filter widgets, refreshed with the statistics.
+create materialized view if not exists "FilterOptions" as
+select distinct 'artist' as dimension, artist_name as name from "Setlist" where artist_name is not null
+union
+select distinct 'venue', venue_name from "Setlist" where venue_name is not null
+union
+select distinct 'city', city_name from "Setlist" where city_name is not null
+union
+select distinct 'country', country_name from "Setlist" where country_name is not null
+union
+select distinct 'year', extract(year from event_date)::int::text from "Setlist" where event_date is not null;
+
+grant select on "FilterOptions" to anon, authenticated;
+
+create or replace function refresh_concert_stats() returns void
+language plpgsql security definer as $$
+begin
+    refresh materialized view "ConcertEvent";
+    refresh materialized view "ConcertStats";
+    refresh materialized view "FilterOptions";
+end;
+$$;
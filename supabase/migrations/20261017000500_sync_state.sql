@@ -0,0 +1,8 @@
+-- Single-row table holding the data version written by the sync job at the end
+-- of each run. Dashboards poll it and reload their shared data when it changes.
+create table if not exists "SyncState" (
+    id int primary key check (id = 1),
+    version text not null
+);
+
+grant select on "SyncState" to anon, authenticated;
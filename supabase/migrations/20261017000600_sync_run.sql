@@ -0,0 +1,12 @@
+-- One row per sync job run with its stage timings and counters. The full run
+-- report is kept as JSON, the columns allow quick comparisons across runs.
+create table if not exists "SyncRun" (
+    id bigint generated always as identity primary key,
+    started_at timestamptz not null,
+    duration_seconds double precision not null,
+    mode text not null,
+    success boolean not null,
+    report jsonb not null
+);
+
+create index if not exists "SyncRun_started_at_idx" on "SyncRun" (started_at desc);
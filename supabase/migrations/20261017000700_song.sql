@@ -0,0 +1,64 @@
+-- Songs of every setlist, extracted from the raw setlist.fm payload by the sync
+-- job (see update_setlists.extract_songs). Rows are rebuilt whenever their
+-- setlist is rewritten and disappear with it.
+create table if not exists "Song" (
+    setlist_id text not null references "Setlist" (id) on delete cascade,
+    position int not null,
+    artist_name text,
+    song_name text not null,
+    set_name text,
+    encore int,
+    cover_artist text,
+    tape boolean not null default false,
+    primary key (setlist_id, position)
+);
+
+-- Song search uses ilike '%...%', which needs a trigram index to avoid a full scan
+create extension if not exists pg_trgm;
+create index if not exists song_song_name_trgm_idx on "Song" using gin (song_name gin_trgm_ops);
+create index if not exists song_artist_song_idx on "Song" (artist_name, song_name);
+
+grant select on "Song" to anon, authenticated;
+
+-- Backfill from the setlists already stored, numbered like extract_songs()
+insert into "Song" (setlist_id, position, artist_name, song_name, set_name, encore, cover_artist, tape)
+select
+    s.id,
+    row_number() over (partition by s.id order by sets.set_index, songs.song_index)::int,
+    s.artist_name,
+    songs.entry->>'name',
+    sets.entry->>'name',
+    (sets.entry->>'encore')::int,
+    songs.entry->'cover'->>'name',
+    coalesce((songs.entry->>'tape')::boolean, false)
+from "Setlist" s
+cross join lateral jsonb_array_elements(coalesce(s.raw::jsonb->'sets'->'set', '[]'::jsonb)) with ordinality as sets(entry, set_index)
+cross join lateral jsonb_array_elements(coalesce(sets.entry->'song', '[]'::jsonb)) with ordinality as songs(entry, song_index)
+where coalesce(songs.entry->>'name', '') <> ''
+on conflict do nothing;
+
+-- How often each song was heard live (tape intros and outros are not counted)
+create materialized view if not exists "SongStats" as
+select
+    song.artist_name,
+    song.song_name,
+    count(*) as times_heard,
+    max(setlist.event_date) as last_heard
+from "Song" song
+join "Setlist" setlist on setlist.id = song.setlist_id
+where not song.tape
+group by song.artist_name, song.song_name;
+
+create index if not exists songstats_times_heard_idx on "SongStats" (times_heard desc);
+
+grant select on "SongStats" to anon, authenticated;
+
+create or replace function refresh_concert_stats() returns void
+language plpgsql security definer as $$
+begin
+    refresh materialized view "ConcertEvent";
+    refresh materialized view "ConcertStats";
+    refresh materialized view "FilterOptions";
+    refresh materialized view "SongStats";
+end;
+$$;
@@ -0,0 +1,57 @@
+-- Coordinates per venue, filled by the sync job with the city coordinates that
+-- setlist.fm reports for each new venue. override_lat/override_long correct
+-- wrong coordinates: a row with venue_name = '' overrides a whole city, a venue
+-- row only that venue. Setlist rows pick up a changed override when they are
+-- rewritten (SYNC_MODE=full); the MapLocation view applies it right away.
+create table if not exists "Location" (
+    city_name text not null,
+    country_name text not null,
+    venue_name text not null default '',
+    lat double precision,
+    long double precision,
+    override_lat double precision,
+    override_long double precision,
+    updated_at timestamptz not null default now(),
+    primary key (city_name, country_name, venue_name)
+);
+
+grant select on "Location" to anon, authenticated;
+
+-- setlist.fm places Oberhausen far off, previously fixed in update_setlists.py
+insert into "Location" (city_name, country_name, venue_name, override_lat, override_long)
+values ('Oberhausen', 'Germany', '', 51.47, 6.85)
+on conflict (city_name, country_name, venue_name) do update
+set override_lat = excluded.override_lat, override_long = excluded.override_long;
+
+-- Events per venue with the effective coordinates, read by the dashboard map
+create materialized view if not exists "MapLocation" as
+select
+    s.venue_name,
+    s.city_name,
+    s.country_name,
+    coalesce(venue.override_lat, city.override_lat, s.city_lat) as latitude,
+    coalesce(venue.override_long, city.override_long, s.city_long) as longitude,
+    count(distinct s.event_date) as events
+from "Setlist" s
+left join "Location" venue
+    on venue.city_name = s.city_name and venue.country_name = s.country_name and venue.venue_name = s.venue_name
+left join "Location" city
+    on city.city_name = s.city_name and city.country_name = s.country_name and city.venue_name = ''
+where s.venue_name is not null
+  and s.city_name is not null
+  and s.country_name is not null
+  and s.event_date is not null
+group by s.venue_name, s.city_name, s.country_name, latitude, longitude;
+
+grant select on "MapLocation" to anon, authenticated;
+
+create or replace function refresh_concert_stats() returns void
+language plpgsql security definer as $$
+begin
+    refresh materialized view "ConcertEvent";
+    refresh materialized view "ConcertStats";
+    refresh materialized view "FilterOptions";
+    refresh materialized view "SongStats";
+    refresh materialized view "MapLocation";
+end;
+$$;
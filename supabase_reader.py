@@ -0,0 +1,46 @@
+"""Complete reads of large Supabase tables.
+
+A plain select stops at PostgREST's max-rows limit (1000 on Supabase). read_pages()
+asks for the exact row count with the first page and then fetches the remaining
+ranges in parallel, ordered by a unique key so the pages neither overlap nor miss rows.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Rows requested per page; the server may return fewer if its max-rows limit is lower
+PAGE_SIZE = int(os.environ.get("SUPABASE_PAGE_SIZE", "1000"))
+# Pages fetched at the same time after the first one
+READ_WORKERS = int(os.environ.get("SUPABASE_READ_WORKERS", "4"))
+
+
+def read_pages(client, table, columns="*", order=("id",), where=None):
+    """Yields the rows of a table (or view) page by page, in order.
+
+    order must name columns that are unique together. where, if given, receives the
+    select query and returns it with filters applied.
+    """
+    def query(start, size, count=None):
+        select = client.table(table).select(columns, count=count)
+        if where is not None:
+            select = where(select)
+        for column in order:
+            select = select.order(column)
+        return select.range(start, start + size - 1)
+
+    first = query(0, PAGE_SIZE, count="exact").execute()
+    yield first.data
+
+    total = first.count if first.count is not None else len(first.data)
+    # A lower max-rows limit on the server shortens every page to the size of the first
+    step = len(first.data)
+    if not step or step >= total:
+        return
+
+    starts = range(step, total, step)
+    with ThreadPoolExecutor(max_workers=READ_WORKERS) as executor:
+        yield from executor.map(lambda start: query(start, step).execute().data, starts)
+
+
+def read_rows(client, table, columns="*", order=("id",), where=None):
+    """All rows of a table (or view) as one list, see read_pages()."""
+    return [row for page in read_pages(client, table, columns, order, where) for row in page]
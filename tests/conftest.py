@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Like `python update_setlists.py` and `streamlit run`, make the repository modules importable
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,91 @@
+import pandas as pd
+import pytest
+
+from analytics import (
+    EVENT_KEYS, cluster_locations, filter_concerts, group_events, monthly_counts, normalize_concerts, timeline_start,
+)
+
+
+@pytest.fixture
+def concerts():
+    rows = [
+        ("a", "Artist A", "Venue 1", "City X", "Country C", "2020-01-10", 50.0, 7.0),
+        ("b", "Artist B", "Venue 1", "City X", "Country C", "2020-01-10", 50.0, 7.0),
+        ("c", "Artist A", "Venue 2", "City Y", "Country D", "2021-06-05", 48.0, 11.0),
+        ("d", "Artist C", "Venue 3", "City X", "Country C", "2022-03-01", 50.0, 7.0),
+    ]
+    frame = pd.DataFrame(rows, columns=["id", "artist_name", "venue_name", "city_name", "country_name", "event_date", "city_lat", "city_long"])
+    frame["url"] = "https://www.setlist.fm/setlist/" + frame["id"] + ".html"
+    return normalize_concerts(frame)
+
+
+@pytest.fixture
+def events(concerts):
+    return group_events(concerts, EVENT_KEYS)
+
+
+def no_filters(**filters):
+    return {"artist_name": (), "venue_name": (), "city_name": (), "country_name": (), "years": (2020, 2022), **filters}
+
+
+def test_filter_concerts_without_filters_keeps_all(concerts):
+    assert list(filter_concerts(concerts, no_filters())["id"]) == ["a", "b", "c", "d"]
+
+
+def test_filter_concerts_combines_columns_and_years(concerts):
+    filtered = filter_concerts(concerts, no_filters(artist_name=("Artist A",), years=(2021, 2022)))
+    assert list(filtered["id"]) == ["c"]
+
+
+def test_group_events_collects_artists_and_urls_per_event(events):
+    assert len(events) == 3
+    first = events.sort_values("event_date").iloc[0]
+    assert first["artists"] == ["Artist A", "Artist B"]
+    assert first["urls"] == ["https://www.setlist.fm/setlist/a.html", "https://www.setlist.fm/setlist/b.html"]
+    assert first["location"] == "Venue 1, City X, Country C"
+
+
+def test_timeline_start(events):
+    assert timeline_start(events, None) is None
+    assert timeline_start(events.iloc[0:0], 6) is None
+    assert timeline_start(events, 12) == pd.Timestamp("2021-03-01")
+
+
+def test_monthly_counts_within_window(events):
+    everything = monthly_counts(events, None)
+    assert list(everything["month"]) == [pd.Timestamp("2020-01-01"), pd.Timestamp("2021-06-01"), pd.Timestamp("2022-03-01")]
+    assert list(everything["events"]) == [1, 1, 1]
+
+    last_year = monthly_counts(events, 12)
+    assert list(last_year["month"]) == [pd.Timestamp("2021-06-01"), pd.Timestamp("2022-03-01")]
+
+
+@pytest.fixture
+def points():
+    return pd.DataFrame({
+        "venue_name": ["Venue 1", "Venue 2", "Venue 3"],
+        "city_name": ["City X", "City X", "City Y"],
+        "country_name": ["Country C", "Country C", "Country D"],
+        "latitude": [50.2, 50.21, 48.0],
+        "longitude": [6.2, 6.21, 11.0],
+        "events": [3, 1, 2],
+    })
+
+
+def test_cluster_locations_merges_nearby_venues(points):
+    clusters = cluster_locations(points, 5).sort_values("events", ascending=False).reset_index(drop=True)
+    assert list(clusters["events"]) == [4, 2]
+    assert list(clusters["locations"]) == [2, 1]
+    assert clusters.loc[0, "label"] == "Venue 1, City X und 1 weitere"
+    assert clusters.loc[0, "latitude"] == pytest.approx((50.2 * 3 + 50.21) / 4)
+    assert clusters.loc[1, "label"] == "Venue 3, City Y"
+
+
+def test_cluster_locations_separates_venues_when_zoomed_in(points):
+    assert len(cluster_locations(points, 12)) == 3
+
+
+def test_cluster_locations_without_points():
+    clusters = cluster_locations(pd.DataFrame(), 5)
+    assert clusters.empty
+    assert list(clusters.columns) == ["latitude", "longitude", "events", "locations", "label", "radius"]
@@ -1,12 +1,40 @@
 import os
+import re
+import json
+import math
+import queue
+import hashlib
+import threading
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+from itertools import islice
+from urllib.parse import urlsplit
 import requests
-from datetime import datetime
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
 from dotenv import load_dotenv
 from supabase import create_client, Client
 import time
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 import spotipy
+from spotipy.cache_handler import MemoryCacheHandler
 from spotipy.oauth2 import SpotifyClientCredentials
+from supabase_reader import read_pages, read_rows
+
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # only needed for snapshot export
+    pa = pq = None
 
 load_dotenv()
 
@@ -17,207 +45,917 @@ SUPABASE_KEY = os.environ["SUPABASE_API_KEY"]
 SPOTIFY_CLIENT_ID = os.environ["SPOTIFY_CLIENT_ID"]
 SPOTIFY_CLIENT_SECRET = os.environ["SPOTIFY_CLIENT_SECRET"]
 
+# Service endpoints, overridable to run against local stand-ins (see bench/)
+SETLISTFM_API_URL = os.environ.get("SETLISTFM_API_URL", "https://api.setlist.fm/rest/1.0")
+SETLISTFM_WEB_URL = os.environ.get("SETLISTFM_WEB_URL", "https://setlist.fm")
+SPOTIFY_API_URL = os.environ.get("SPOTIFY_API_URL", "https://api.spotify.com/v1/")
+SPOTIFY_TOKEN_URL = os.environ.get("SPOTIFY_TOKEN_URL", "https://accounts.spotify.com/api/token")
+
+# "incremental" only rewrites new or changed setlists, "full" rewrites all of them
+SYNC_MODE = os.environ.get("SYNC_MODE", "incremental")
+# Rows per bulk upsert/delete request against Supabase
+BATCH_SIZE = int(os.environ.get("SUPABASE_BATCH_SIZE", "200"))
+# setlist.fm allows 2 requests per second for standard API keys
+SETLIST_RATE = float(os.environ.get("SETLISTFM_RATE", "2"))
+SETLIST_WORKERS = int(os.environ.get("SETLISTFM_WORKERS", "4"))
+SETLIST_MAX_ATTEMPTS = 5
+# Pages fetched ahead of the pipeline; bounds the setlists held in memory
+SETLIST_PREFETCH = 2 * SETLIST_WORKERS
+# Concurrent Spotify lookups while enriching fetched rows
+SPOTIFY_WORKERS = int(os.environ.get("SPOTIFY_WORKERS", "4"))
+# Items buffered between pipeline stages before the faster stage has to wait
+PIPELINE_QUEUE_SIZE = int(os.environ.get("PIPELINE_QUEUE_SIZE", "500"))
+# Days before a cached Spotify match (or a cached "not found") is looked up again
+SPOTIFY_CACHE_TTL = timedelta(days=int(os.environ.get("SPOTIFY_CACHE_TTL_DAYS", "30")))
+SPOTIFY_NEGATIVE_CACHE_TTL = timedelta(days=int(os.environ.get("SPOTIFY_NEGATIVE_CACHE_TTL_DAYS", "7")))
+# (connect, read) timeouts in seconds for every outbound HTTP request
+HTTP_TIMEOUT = (5, 30)
+# Responses with an ETag or Last-Modified header are kept here for conditional requests
+HTTP_CACHE_DIR = os.environ.get("HTTP_CACHE_DIR", ".http-cache")
+# Only the upcoming block of the attended page is parsed
+UPCOMING_STRAINER = SoupStrainer('div', class_='userAttendancesAndNote')
+MAX_UPCOMING_PAGES = 10
+# If set, Parquet snapshots of Setlist and Upcoming are written here for the dashboard
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR")
+# Setlist goes last: the dashboard uses its modification time as data version
+SNAPSHOT_COLUMNS = {
+    "Upcoming": ["artist_name", "venue_name", "city_name", "country_name", "event_date", "url"],
+    "Setlist": ["id", "artist_name", "venue_name", "city_name", "city_lat", "city_long", "country_name", "event_date", "url"],
+}
+
+# JSON report of every run; SYNC_REPORT_TABLE (if not empty) also receives a copy
+SYNC_REPORT_PATH = os.environ.get("SYNC_REPORT_PATH", "sync-report.json")
+SYNC_REPORT_TABLE = os.environ.get("SYNC_REPORT_TABLE", "SyncRun")
+
 SETLIST_HEADERS = {
     "x-api-key": SETLIST_API_KEY,
     "Accept": "application/json"
 }
 
+
+class RunReport:
+    """Thread-safe stage timings and counters of one sync run.
+
+    Stage times are summed over all threads, so with concurrent stages they can add
+    up to more than the wall time of the run.
+    """
+
+    def __init__(self):
+        self.started_at = datetime.now(timezone.utc)
+        self.started = time.perf_counter()
+        self.seconds = defaultdict(float)
+        self.calls = Counter()
+        self.counters = Counter()
+        self.lock = threading.Lock()
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.seconds[name] += elapsed
+                self.calls[name] += 1
+
+    def as_dict(self, success):
+        with self.lock:
+            return {
+                "started_at": self.started_at.isoformat(),
+                "duration_seconds": round(time.perf_counter() - self.started, 3),
+                "mode": SYNC_MODE,
+                "success": success,
+                "stages": {name: {"seconds": round(self.seconds[name], 3), "calls": self.calls[name]} for name in sorted(self.seconds)},
+                "counters": dict(sorted(self.counters.items())),
+            }
+
+
+report = RunReport()
+
+
+def count_response(response, *args, **kwargs):
+    """Response hook counting HTTP calls per host and the retries urllib3 made for them."""
+    report.count(f"http_requests.{urlsplit(response.url).hostname}")
+    retries = getattr(response.raw, "retries", None)
+    if retries is not None and retries.history:
+        report.count("http_retries", len(retries.history))
+
+
+def create_http_session():
+    """Creates a keep-alive session that retries GETs on 429/5xx with exponential backoff.
+
+    The setlist.fm API is the exception: its 429s go back to fetch_setlist_page, which
+    pauses the shared token bucket instead of letting every worker retry on its own.
+    """
+    def adapter(status_forcelist):
+        retry = Retry(
+            total=5,
+            backoff_factor=1,
+            status_forcelist=status_forcelist,
+            allowed_methods=["GET"],
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        return HTTPAdapter(pool_connections=4, pool_maxsize=max(10, SETLIST_WORKERS, 2 * SPOTIFY_WORKERS), max_retries=retry)
+
+    session = requests.Session()
+    default = adapter([429, 500, 502, 503, 504])
+    session.mount("https://", default)
+    session.mount("http://", default)
+    # requests picks the adapter with the longest matching prefix
+    session.mount(SETLISTFM_API_URL, adapter([500, 502, 503, 504]))
+    session.hooks["response"].append(count_response)
+    return session
+
+
+http = create_http_session()
+
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
-sp = spotipy.Spotify(auth_manager=SpotifyClientCredentials(
+spotify_auth = SpotifyClientCredentials(
     client_id=SPOTIFY_CLIENT_ID,
-    client_secret=SPOTIFY_CLIENT_SECRET
-))
+    client_secret=SPOTIFY_CLIENT_SECRET,
+    requests_session=http,
+    requests_timeout=HTTP_TIMEOUT,
+    # Keep the token in memory; spotipy's default token file would land in the working directory
+    cache_handler=MemoryCacheHandler(),
+)
+spotify_auth.OAUTH_TOKEN_URL = SPOTIFY_TOKEN_URL
+sp = spotipy.Spotify(auth_manager=spotify_auth, requests_session=http, requests_timeout=HTTP_TIMEOUT)
+sp.prefix = SPOTIFY_API_URL
 
+# Spotify artist lookups by artist name, persisted in the SpotifyArtist table
+spotify_cache = {}
+spotify_cache_updates = {}
+# Venue coordinates and overrides by (city, country, venue), persisted in the Location table.
+# A venue of '' holds the override for a whole city.
+location_cache = {}
+location_updates = {}
 
-def fetch_all_setlists():
-    """Fetches all 'attended' setlists using pagination."""
-    results = []
-    page = 1
+# One lock per artist, so concurrent enrich workers search every artist only once
+spotify_locks = {}
+spotify_locks_lock = threading.Lock()
 
-    while True:
-        url = f"https://api.setlist.fm/rest/1.0/user/{USERNAME}/attended?p={page}"
-        r = requests.get(url, headers=SETLIST_HEADERS)
 
-        if r.status_code != 200:
-            raise Exception(f"Error fetching setlists: {r.text}")
+class CachedResponse:
+    """Stands in for a requests.Response when a 304 is answered from the on-disk cache."""
+
+    status_code = 200
+
+    def __init__(self, text, headers):
+        self.text = text
+        self.headers = headers
+
+    def json(self):
+        return json.loads(self.text)
+
+
+def http_cache_path(url):
+    return os.path.join(HTTP_CACHE_DIR, hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json")
+
+
+def read_cached_response(url):
+    """Returns the cached {'etag', 'last_modified', 'text'} entry for a URL, or None."""
+    try:
+        with open(http_cache_path(url), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_cached_response(url, response):
+    """Stores a 200 response that can be revalidated later. Writes are atomic, so concurrent fetches are safe."""
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+    if not etag and not last_modified:
+        return
+
+    path = http_cache_path(url)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(HTTP_CACHE_DIR, exist_ok=True)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"etag": etag, "last_modified": last_modified, "text": response.text}, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Exception caching {url}: {e}")
+
+
+def http_get(url, headers=None):
+    """GET through the shared session with timeouts, retries and conditional requests.
+
+    If an earlier response for the URL carried an ETag or Last-Modified header, it is
+    revalidated with If-None-Match/If-Modified-Since and a 304 is answered from disk.
+    """
+    headers = dict(headers or {})
+    cached = read_cached_response(url)
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    response = http.get(url, headers=headers, timeout=HTTP_TIMEOUT)
+
+    if response.status_code == 304 and cached:
+        report.count("http_cache_hits")
+        return CachedResponse(cached["text"], response.headers)
+    if response.status_code == 200:
+        write_cached_response(url, response)
+    return response
+
+
+class TokenBucket:
+    """Thread-safe token bucket allowing on average `rate` calls per second."""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Blocks until a call is allowed."""
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Holds back all callers for the given number of seconds, e.g. after HTTP 429."""
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+
+setlist_bucket = TokenBucket(SETLIST_RATE)
+
+
+def parse_retry_after(value, default):
+    """Returns the delay in seconds of a Retry-After header (seconds or HTTP date)."""
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return default
 
-        data = r.json()
-        setlists = data.get("setlist", [])
-        if not setlists:
-            break
 
-        results.extend(setlists)
+def fetch_setlist_page(page):
+    """Fetches one page of 'attended' setlists, pausing all workers while setlist.fm answers 429."""
+    url = f"{SETLISTFM_API_URL}/user/{USERNAME}/attended?p={page}"
 
-        # Stop when all pages are fetched
-        if page >= data.get("total", 0) / data.get("itemsPerPage", 1):
-            break
+    for attempt in range(SETLIST_MAX_ATTEMPTS):
+        setlist_bucket.acquire()
+        with report.stage("setlist_pages"):
+            r = http_get(url, headers=SETLIST_HEADERS)
 
-        page += 1
-        time.sleep(1)
+        if r.status_code == 429:
+            report.count("setlist_rate_limited")
+            setlist_bucket.pause(parse_retry_after(r.headers.get("Retry-After"), 2 ** attempt))
+            continue
+        if r.status_code != 200:
+            raise Exception(f"Error fetching setlists: {r.text}")
+        return r.json()
+
+    raise Exception(f"Error fetching setlists: page {page} still rate limited after {SETLIST_MAX_ATTEMPTS} attempts")
+
+
+def iter_setlists():
+    """Yields all 'attended' setlists as their pages arrive.
+
+    Pages after the first are fetched concurrently, but at most SETLIST_PREFETCH pages
+    ahead of the consumer, so memory stays flat no matter how long the history is.
+    """
+    data = fetch_setlist_page(1)
+    setlists = data.get("setlist", [])
+    if not setlists:
+        return
+    yield from setlists
+
+    page_count = math.ceil(data.get("total", 0) / data.get("itemsPerPage", 1))
+    pages = iter(range(2, page_count + 1))
+
+    # The token bucket keeps the workers within setlist.fm's rate limit
+    with ThreadPoolExecutor(max_workers=SETLIST_WORKERS) as executor:
+        pending = deque(executor.submit(fetch_setlist_page, page) for page in islice(pages, SETLIST_PREFETCH))
+        while pending:
+            data = pending.popleft().result()
+            for page in islice(pages, 1):
+                pending.append(executor.submit(fetch_setlist_page, page))
+            yield from data.get("setlist", [])
+
+
+def parse_upcoming_entry(el):
+    """Extracts one upcoming concert from an <li class="setlist"> element."""
+    content = el.find('div', class_='content')
+    link = content.find('a')
+    artist = link.find('strong').string
+
+    location_string = content.find('span', class_='subline').find('span').string
+    location_parts = [part.strip() for part in location_string.split(',')]
+    venue = location_parts[0] if len(location_parts) > 0 else None
+    city = location_parts[1] if len(location_parts) > 1 else None
+    country = location_parts[2] if len(location_parts) > 2 else None
+    url = "https://setlist.fm" + link['href'].lstrip('.')
+
+    month, day, year = list(el.find('span', class_='smallDateBlock').stripped_strings)[:3]
+    event_date = datetime.strptime(f"{day} {month} {year}", "%d %b %Y").date()
+
+    return {
+        "artist_name": artist,
+        "venue_name": venue,
+        "city_name": city,
+        "country_name": country,
+        "event_date": event_date.isoformat(),
+        "url": url,
+    }
+
+
+def parse_upcoming_page(html):
+    """Parses the upcoming block of an attended page.
+
+    Returns the concerts and the page numbers linked from the block. Malformed entries
+    are reported and skipped instead of failing the whole page, but a page without the
+    block or without a single parseable entry raises, so Upcoming is never cleared
+    because of a layout change.
+    """
+    soup = BeautifulSoup(html, HTML_PARSER, parse_only=UPCOMING_STRAINER)
+    upcoming_div = soup.find('div', class_='userAttendancesAndNote')
+    if upcoming_div is None:
+        raise Exception("Error parsing upcoming concerts: attended page has no upcoming block")
+
+    entries = upcoming_div.find_all('li', class_='setlist')
+    upcoming = []
+    for el in entries:
+        try:
+            upcoming.append(parse_upcoming_entry(el))
+        except Exception as e:
+            print(f"Exception parsing upcoming concert: {e}")
+    if entries and not upcoming:
+        raise Exception(f"Error parsing upcoming concerts: none of {len(entries)} entries could be parsed")
+
+    pages = set()
+    for link in upcoming_div.find_all('a', href=True):
+        match = re.search(r"[?&]page=(\d+)", link['href'])
+        if match:
+            pages.add(int(match.group(1)))
 
-    return results
+    return upcoming, pages
 
 
 def fetch_upcoming_concerts():
-    response = requests.get(f"https://setlist.fm/attended/{USERNAME}")
-    if response.status_code != 200:
-        raise Exception(f"Error fetching upcoming concerts: {response.text}")
-    soup = BeautifulSoup(response.text, 'html.parser')
+    """Scrapes the upcoming concerts from the user's attended page, following its pagination."""
     upcoming = []
+    seen_urls = set()
+    page = 1
 
-    upcoming_div = soup.find('div', class_='userAttendancesAndNote')
-    setlist_el = upcoming_div.find_all('li', class_='setlist')
-    
-    for el in setlist_el:
-        artist = el.find('div', class_='content').find('a').find('strong').string
-        
-        location_string = el.find('div', class_='content').find('span', class_='subline').find('span').string
-        location_parts = [part.strip() for part in location_string.split(',')]
-        venue = location_parts[0] if len(location_parts) > 0 else None
-        city = location_parts[1] if len(location_parts) > 1 else None
-        country = location_parts[2] if len(location_parts) > 2 else None
-        href = el.find('div', class_='content').find('a')['href']
-        url = "https://setlist.fm" + href.lstrip('.')
-
-        for i, value in enumerate(el.find('span', class_='smallDateBlock').stripped_strings):
-            if (i == 0):
-                month = value
-            elif (i == 1):
-                day = value
-            elif (i == 2):
-                year = value
-
-        date_str = f"{day} {month} {year}"
-        date = datetime.strptime(date_str, "%d %b %Y").date()
-
-        payload = {
-            "artist_name": artist,
-            "venue_name": venue,
-            "city_name": city,
-            "country_name": country,
-            "event_date": date.isoformat(),
-            "url": url,
-        }
-        upcoming.append(payload)
+    while page:
+        url = f"{SETLISTFM_WEB_URL}/attended/{USERNAME}" + (f"?page={page}" if page > 1 else "")
+        with report.stage("upcoming_pages"):
+            response = http_get(url)
+        if response.status_code != 200:
+            raise Exception(f"Error fetching upcoming concerts: {response.text}")
+
+        with report.stage("upcoming_parse"):
+            concerts, pages = parse_upcoming_page(response.text)
+        new_concerts = [concert for concert in concerts if concert["url"] not in seen_urls]
+        upcoming.extend(new_concerts)
+        seen_urls.update(concert["url"] for concert in new_concerts)
+
+        # Stop when there is no next page or it only repeats what we have
+        has_next = page + 1 in pages and new_concerts and page < MAX_UPCOMING_PAGES
+        page = page + 1 if has_next else None
 
     return upcoming
 
 
-def upsert_setlists(setlists):
-
-    # Replace records from setlist.fm
-    for setlist in all_setlists:
-        """Replace a setlist in Supabase to keep data exactly in sync with setlist.fm."""
-        setlist_id = setlist.get("id")
-
-        # Flattened fields
-        artist = setlist.get("artist", {}).get("name")
-        venue = setlist.get("venue", {}).get("name")
-        city = setlist.get("venue", {}).get("city", {}).get("name")
-        country = setlist.get("venue", {}).get("city", {}).get("country", {}).get("name")
-        date_str = setlist.get("eventDate")
-        url = setlist.get("url")
-        city_lat = setlist.get("venue", {}).get("city", {}).get("coords", {}).get("lat")
-        city_long = setlist.get("venue", {}).get("city", {}).get("coords", {}).get("long")
-        
-        # fix wrong coords for Oberhausen
-        if city == "Oberhausen":
-            city_lat = 51.47
-            city_long = 6.85
+def chunked(items, size):
+    """Yields consecutive lists of at most size items."""
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
 
-        try:
-            event_date = datetime.strptime(date_str, "%d-%m-%Y").date().isoformat()
-        except:
-            event_date = None
 
+def write_batches(table, rows, label=lambda row: row["id"], upsert=True):
+    """Writes rows to a Supabase table in bulk requests of BATCH_SIZE rows.
+
+    Failing batches are reported with the labels of their rows and skipped.
+    Returns the number of rows written.
+    """
+    written = 0
+    for batch in chunked(rows, BATCH_SIZE):
+        try:
+            query = supabase.table(table)
+            query = query.upsert(batch) if upsert else query.insert(batch)
+            with report.stage("db_write"):
+                query.execute()
+            written += len(batch)
+        except Exception as e:
+            report.count("failed_batches")
+            print(f"Exception writing {table} batch {[label(row) for row in batch]}: {e}")
+    report.count(f"rows_written.{table}", written)
+    return written
 
-        # Artist in Spotify suchen
-        results = sp.search(q='artist:' + artist, type='artist', limit=1)
 
-        if results['artists']['items']:
-            sp_artist = results['artists']['items'][0]
-            spotify_id = sp_artist['id']
-            spotify_url = sp_artist['external_urls']['spotify']
-
-        payload = {
-            "id": setlist_id,
-            "artist_name": artist,
-            "venue_name": venue,
-            "city_name": city,
-            "city_lat": city_lat,
-            "city_long": city_long,
-            "country_name": country,
-            "event_date": event_date,
-            "url": url,
-            "raw": setlist,
-            "spotify_id": spotify_id,
-            "spotify_url": spotify_url,
-        }
-
-        # Delete existing record and insert new one to keep data exactly in sync
+def delete_batches(table, ids, column="id"):
+    """Deletes rows by ID with one 'in' filter per BATCH_SIZE IDs. Returns the number of IDs deleted."""
+    deleted = 0
+    for batch in chunked(ids, BATCH_SIZE):
         try:
-            supabase.table("Setlist").delete().eq("id", setlist_id).execute()
-            supabase.table("Setlist").insert(payload).execute()
-            print(f"Replaced {setlist_id}")
+            with report.stage("db_delete"):
+                supabase.table(table).delete().in_(column, batch).execute()
+            deleted += len(batch)
         except Exception as e:
-            print(f"Exception for {setlist_id}: {e}")
-    
-    # Get IDs from setlist.fm
-    setlist_fm_ids = set(s.get("id") for s in all_setlists)
+            report.count("failed_batches")
+            print(f"Exception deleting {table} batch {batch}: {e}")
+    report.count(f"rows_deleted.{table}", deleted)
+    return deleted
 
-    # Get all IDs from Supabase
-    existing_records = supabase.table("Setlist").select("id").execute()
-    supabase_ids = set(record["id"] for record in existing_records.data)
 
-    # Delete records in Supabase that are not in setlist.fm
-    ids_to_delete = supabase_ids - setlist_fm_ids
-    for setlist_id in ids_to_delete:
+def search_spotify_artist(artist):
+    """Returns (spotify_id, spotify_url) of the best Spotify match for an artist."""
+    report.count("spotify_searches")
+    with report.stage("spotify_search"):
+        results = sp.search(q='artist:' + artist, type='artist', limit=1)
+
+    if results['artists']['items']:
+        sp_artist = results['artists']['items'][0]
+        return sp_artist['id'], sp_artist['external_urls']['spotify']
+    return None, None
+
+
+def load_spotify_cache():
+    """Loads previous Spotify artist lookups from Supabase into spotify_cache."""
+    try:
+        with report.stage("db_read"):
+            records = read_rows(supabase, "SpotifyArtist", order=("artist_name",))
+    except Exception as e:
+        print(f"Exception loading Spotify artist cache: {e}")
+        return
+
+    for record in records:
+        spotify_cache[record["artist_name"]] = record
+    print(f"Loaded {len(spotify_cache)} cached Spotify artists.")
+
+
+def is_fresh(entry):
+    """True if a cached lookup is younger than its TTL. Misses expire sooner than matches."""
+    ttl = SPOTIFY_CACHE_TTL if entry.get("spotify_id") else SPOTIFY_NEGATIVE_CACHE_TTL
+    fetched_at = datetime.fromisoformat(entry["fetched_at"])
+    return datetime.now(timezone.utc) - fetched_at < ttl
+
+
+def spotify_lock(artist):
+    with spotify_locks_lock:
+        return spotify_locks.setdefault(artist, threading.Lock())
+
+
+def lookup_spotify_artist(artist):
+    """Returns (spotify_id, spotify_url) for an artist, searching Spotify only when the cache has no fresh entry.
+
+    Thread-safe: concurrent lookups of the same artist wait for the first search instead of repeating it.
+    """
+    if not artist:
+        return None, None
+
+    with spotify_lock(artist):
+        entry = spotify_cache.get(artist)
+        if entry is None or not is_fresh(entry):
+            spotify_id, spotify_url = search_spotify_artist(artist)
+            entry = {
+                "artist_name": artist,
+                "spotify_id": spotify_id,
+                "spotify_url": spotify_url,
+                "fetched_at": datetime.now(timezone.utc).isoformat(),
+            }
+            spotify_cache[artist] = entry
+            spotify_cache_updates[artist] = entry
+        else:
+            report.count("spotify_cache_hits")
+
+    return entry["spotify_id"], entry["spotify_url"]
+
+
+def save_spotify_cache():
+    """Persists the lookups made during this run."""
+    written = write_batches("SpotifyArtist", list(spotify_cache_updates.values()), label=lambda row: row["artist_name"])
+    print(f"Cached {written} Spotify artists.")
+
+
+def load_locations():
+    """Loads known venues and coordinate overrides from Supabase into location_cache."""
+    try:
+        with report.stage("db_read"):
+            records = read_rows(supabase, "Location", order=("city_name", "country_name", "venue_name"))
+    except Exception as e:
+        print(f"Exception loading locations: {e}")
+        return
+
+    for record in records:
+        location_cache[(record["city_name"], record["country_name"], record["venue_name"])] = record
+    print(f"Loaded {len(location_cache)} locations.")
+
+
+def resolve_coordinates(venue, city, country, lat, long):
+    """Coordinates of a venue: its override, else the override of its city, else the given setlist.fm coordinates.
+
+    Venues that are not in the Location table yet are queued for save_locations().
+    """
+    venue_key = (city, country, venue)
+    if venue and city and country and venue_key not in location_cache:
+        entry = {"city_name": city, "country_name": country, "venue_name": venue, "lat": lat, "long": long}
+        location_cache[venue_key] = entry
+        location_updates[venue_key] = entry
+
+    for key in (venue_key, (city, country, "")):
+        entry = location_cache.get(key) or {}
+        if entry.get("override_lat") is not None and entry.get("override_long") is not None:
+            return entry["override_lat"], entry["override_long"]
+    return lat, long
+
+
+def save_locations():
+    """Stores the venues seen for the first time in this run. Existing rows and their overrides are not touched."""
+    written = write_batches("Location", list(location_updates.values()), label=lambda row: f"{row['venue_name']}, {row['city_name']}")
+    print(f"Stored {written} new locations.")
+
+
+def build_setlist_payload(setlist):
+    """Flattens a setlist.fm setlist into a row of the Setlist table."""
+    artist = setlist.get("artist", {}).get("name")
+    venue = setlist.get("venue", {}).get("name")
+    city = setlist.get("venue", {}).get("city", {}).get("name")
+    country = setlist.get("venue", {}).get("city", {}).get("country", {}).get("name")
+    date_str = setlist.get("eventDate")
+    url = setlist.get("url")
+    city_lat = setlist.get("venue", {}).get("city", {}).get("coords", {}).get("lat")
+    city_long = setlist.get("venue", {}).get("city", {}).get("coords", {}).get("long")
+
+    # Overrides in the Location table correct wrong setlist.fm coordinates
+    city_lat, city_long = resolve_coordinates(venue, city, country, city_lat, city_long)
+
+    try:
+        event_date = datetime.strptime(date_str, "%d-%m-%Y").date().isoformat()
+    except:
+        event_date = None
+
+    # Artist in Spotify suchen
+    spotify_id, spotify_url = lookup_spotify_artist(artist)
+
+    return {
+        "id": setlist.get("id"),
+        "artist_name": artist,
+        "venue_name": venue,
+        "city_name": city,
+        "city_lat": city_lat,
+        "city_long": city_long,
+        "country_name": country,
+        "event_date": event_date,
+        "url": url,
+        "raw": setlist,
+        "spotify_id": spotify_id,
+        "spotify_url": spotify_url,
+        "last_updated": setlist.get("lastUpdated"),
+    }
+
+
+def extract_songs(setlist):
+    """Rows of the Song table for a setlist.fm setlist, numbered in playing order across all sets."""
+    songs = []
+    for song_set in setlist.get("sets", {}).get("set", []):
+        for song in song_set.get("song", []):
+            if not song.get("name"):
+                continue
+            songs.append({
+                "setlist_id": setlist.get("id"),
+                "position": len(songs) + 1,
+                "artist_name": setlist.get("artist", {}).get("name"),
+                "song_name": song["name"],
+                "set_name": song_set.get("name"),
+                "encore": song_set.get("encore"),
+                "cover_artist": (song.get("cover") or {}).get("name"),
+                "tape": bool(song.get("tape")),
+            })
+    return songs
+
+
+def replace_songs(payloads):
+    """Rebuilds the Song rows of freshly written setlists. Songs of deleted setlists go with them (on delete cascade).
+
+    Returns False if some of the songs could not be replaced.
+    """
+    ids = [payload["id"] for payload in payloads]
+    deleted = delete_batches("Song", ids, column="setlist_id")
+    songs = [song for payload in payloads for song in extract_songs(payload["raw"])]
+    written = write_batches("Song", songs, label=lambda row: f"{row['setlist_id']}#{row['position']}", upsert=False)
+    return deleted == len(ids) and written == len(songs)
+
+
+def forget_versions(payloads):
+    """Clears the stored 'lastUpdated' of setlists, so the next incremental run writes them again."""
+    ids = [payload["id"] for payload in payloads]
+    try:
+        with report.stage("db_write"):
+            supabase.table("Setlist").update({"last_updated": None}).in_("id", ids).execute()
+    except Exception as e:
+        print(f"Exception resetting setlist versions {ids}: {e}")
+
+
+def fetch_stored_versions():
+    """Returns {setlist_id: last_updated} for all setlists stored in Supabase."""
+    with report.stage("db_read"):
+        return {record["id"]: record.get("last_updated") for page in read_pages(supabase, "Setlist", "id, last_updated") for record in page}
+
+
+def is_unchanged(setlist, stored_versions):
+    """True if the stored copy of a setlist matches its setlist.fm 'lastUpdated' stamp."""
+    last_updated = setlist.get("lastUpdated")
+    return last_updated is not None and stored_versions.get(setlist.get("id")) == last_updated
+
+
+PIPELINE_DONE = object()
+
+
+def run_pipeline(produce, build, write):
+    """Runs a fetch → enrich → write pipeline whose stages are connected by bounded queues.
+
+    produce(emit) runs on the calling thread and emits raw items. build(item) turns an
+    item into a row (or None to drop it) on SPOTIFY_WORKERS threads, and write(rows) gets
+    batches of up to BATCH_SIZE rows on one writer thread. A full queue blocks the stage
+    in front of it, so a slow writer throttles fetching instead of buffering everything.
+    The first exception of any stage stops produce at its next emit and is re-raised
+    once all threads have finished. The other stages keep draining their queues, so a
+    failed stage never leaves the others blocked on a full queue.
+    """
+    items = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    rows = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    errors = []
+
+    def emit(item):
+        if errors:
+            raise errors[0]
+        items.put(item)
+
+    def enrich():
+        while (item := items.get()) is not PIPELINE_DONE:
+            if errors:
+                continue
+            try:
+                row = build(item)
+            except Exception as e:
+                errors.append(e)
+                continue
+            if row is not None:
+                rows.put(row)
+
+    def writer():
+        batch = []
+        while (row := rows.get()) is not PIPELINE_DONE:
+            if errors:
+                continue
+            batch.append(row)
+            if len(batch) >= BATCH_SIZE:
+                try:
+                    write(batch)
+                except Exception as e:
+                    errors.append(e)
+                batch = []
+        if batch and not errors:
+            try:
+                write(batch)
+            except Exception as e:
+                errors.append(e)
+
+    enrichers = [threading.Thread(target=enrich, daemon=True) for _ in range(SPOTIFY_WORKERS)]
+    writer_thread = threading.Thread(target=writer, daemon=True)
+    for thread in enrichers + [writer_thread]:
+        thread.start()
+
+    try:
+        produce(emit)
+    finally:
+        for _ in enrichers:
+            items.put(PIPELINE_DONE)
+        for thread in enrichers:
+            thread.join()
+        rows.put(PIPELINE_DONE)
+        writer_thread.join()
+    if errors:
+        raise errors[0]
+
+
+def sync_setlists():
+    """Streams new and changed setlists into Supabase and removes the ones deleted on setlist.fm.
+
+    In the default incremental mode, setlists whose 'lastUpdated' stamp matches the
+    stored row are skipped. Set SYNC_MODE=full to rewrite every setlist. Deletions only
+    happen after a complete fetch, so a failed run never removes setlists.
+    """
+    stored_versions = fetch_stored_versions()
+    # Only the IDs are kept for the orphan check, the setlists themselves are streamed
+    setlist_fm_ids = set()
+    counts = {"unchanged": 0, "written": 0}
+
+    def produce(emit):
+        print("Fetching setlists...")
+        for setlist in iter_setlists():
+            setlist_fm_ids.add(setlist.get("id"))
+            if SYNC_MODE != "full" and is_unchanged(setlist, stored_versions):
+                counts["unchanged"] += 1
+            else:
+                emit(setlist)
+        print(f"Found {len(setlist_fm_ids)} setlists.")
+        report.count("setlists_found", len(setlist_fm_ids))
+        report.count("setlists_unchanged", counts["unchanged"])
+
+    def build(setlist):
         try:
-            supabase.table("Setlist").delete().eq("id", setlist_id).execute()
-            print(f"Deleted {setlist_id}")
+            return build_setlist_payload(setlist)
         except Exception as e:
-            print(f"Exception deleting {setlist_id}: {e}")
+            print(f"Exception for {setlist.get('id')}: {e}")
+
+    def write(payloads):
+        # Upsert overwrites every column, which keeps the rows exactly in sync
+        written = write_batches("Setlist", payloads)
+        counts["written"] += written
+        # Songs reference their setlist, so they can only be written once it is stored.
+        # If they fail, the setlists must not look up to date to the next incremental run.
+        if written == len(payloads) and not replace_songs(payloads):
+            report.count("setlists_song_failures", len(payloads))
+            forget_versions(payloads)
+
+    with report.stage("setlist_pipeline"):
+        run_pipeline(produce, build, write)
+    print(f"Replaced {counts['written']} setlists, skipped {counts['unchanged']} unchanged setlists.")
+
+    # Delete records in Supabase that are not in setlist.fm
+    ids_to_delete = sorted(set(stored_versions) - setlist_fm_ids)
+    deleted = delete_batches("Setlist", ids_to_delete)
+    print(f"Deleted {deleted} setlists.")
 
 
-def upsert_upcoming_concerts(upcoming_concerts):
+def refresh_stats():
+    """Rebuilds the materialized views read by the dashboard (concert, filter, song and map statistics)."""
     try:
-        supabase.table("Upcoming").delete().neq("id", 0).execute()
+        with report.stage("refresh_stats"):
+            supabase.rpc("refresh_concert_stats").execute()
+        print("Refreshed concert statistics.")
     except Exception as e:
-        print(f"Exception deleting existing upcoming concerts: {e}")
+        print(f"Exception refreshing concert statistics: {e}")
 
-    i = 0
-    for upcoming in upcoming_concerts:
+
+def bump_data_version():
+    """Stores a new data version, which makes running dashboards reload their shared data."""
+    try:
+        supabase.table("SyncState").upsert({"id": 1, "version": datetime.now(timezone.utc).isoformat()}).execute()
+    except Exception as e:
+        print(f"Exception bumping data version: {e}")
+
+
+def snapshot_array(column, values):
+    """Arrow array in the dashboard's compact schema: dictionary-encoded names, date32 dates, float32 coordinates."""
+    if column.endswith("_name"):
+        return pa.array(values, pa.string()).dictionary_encode()
+    if column in ("city_lat", "city_long"):
+        return pa.array(values, pa.float32())
+    if column == "event_date":
+        return pa.array([date.fromisoformat(value) if value else None for value in values], pa.date32())
+    return pa.array(values, pa.string())
+
+
+def export_snapshot():
+    """Writes the dashboard columns of Setlist and Upcoming to Parquet files in SNAPSHOT_DIR."""
+    if pa is None:
+        print("Skipping snapshot export: pyarrow is not installed.")
+        return
+
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    for table, columns in SNAPSHOT_COLUMNS.items():
         try:
-            # Artist in Spotify suchen
-            results = sp.search(q='artist:' + upcoming["artist_name"], type='artist', limit=1)
+            with report.stage("db_read"):
+                rows = read_rows(supabase, table, ", ".join(columns))
+            with report.stage("snapshot_export"):
+                snapshot = pa.table({column: snapshot_array(column, [row.get(column) for row in rows]) for column in columns})
+
+                # Write to a temporary file first so a running dashboard never maps a partial file
+                path = os.path.join(SNAPSHOT_DIR, f"{table}.parquet")
+                pq.write_table(snapshot, f"{path}.tmp")
+                os.replace(f"{path}.tmp", path)
+            print(f"Exported {len(rows)} rows of {table} to {path}.")
+        except Exception as e:
+            print(f"Exception exporting {table} snapshot: {e}")
+
+
+def sync_upcoming_concerts():
+    """Replaces the Upcoming table with the concerts currently listed on setlist.fm."""
+    counts = {"inserted": 0}
 
-            if results['artists']['items']:
-                sp_artist = results['artists']['items'][0]
-                spotify_id = sp_artist['id']
-                spotify_url = sp_artist['external_urls']['spotify']
+    def produce(emit):
+        print("Fetching upcoming concerts...")
+        upcoming_concerts = fetch_upcoming_concerts()
+        print(f"Found {len(upcoming_concerts)} upcoming concerts.")
+        report.count("upcoming_found", len(upcoming_concerts))
+
+        # Only clear the table once the new concerts are known (a page that fails to parse raises
+        # before this); the writer cannot insert before this
+        try:
+            with report.stage("db_delete"):
+                supabase.table("Upcoming").delete().neq("id", 0).execute()
+        except Exception as e:
+            print(f"Exception deleting existing upcoming concerts: {e}")
+
+        for upcoming in upcoming_concerts:
+            emit(upcoming)
+
+    def build(upcoming):
+        try:
+            # Artist in Spotify suchen
+            spotify_id, spotify_url = lookup_spotify_artist(upcoming["artist_name"])
 
             upcoming["spotify_id"] = spotify_id
             upcoming["spotify_url"] = spotify_url
-
-            supabase.table("Upcoming").insert(upcoming).execute()
-            i += 1
+            return upcoming
         except Exception as e:
             print(f"Exception for {upcoming}: {e}")
-    
-    print(f"Inserted {i} upcoming concerts.")
 
+    def write(rows):
+        # Upcoming rows have generated IDs, so they are inserted rather than upserted
+        counts["inserted"] += write_batches("Upcoming", rows, label=lambda row: f"{row['artist_name']} {row['event_date']}", upsert=False)
 
+    with report.stage("upcoming_pipeline"):
+        run_pipeline(produce, build, write)
+    print(f"Inserted {counts['inserted']} upcoming concerts.")
 
-if __name__ == "__main__":
-    print("Fetching setlists...")
-    all_setlists = fetch_all_setlists()
-    print(f"Found {len(all_setlists)} setlists.")
-    upsert_setlists(all_setlists)
 
-    print("Fetching upcoming concerts...")
-    upcoming_concerts = fetch_upcoming_concerts()
-    print(f"Found {len(upcoming_concerts)} upcoming concerts.")
-    upsert_upcoming_concerts(upcoming_concerts)
+def write_run_report(success):
+    """Writes the run report to SYNC_REPORT_PATH and, if configured, to the SYNC_REPORT_TABLE table."""
+    run = report.as_dict(success)
+
+    if SYNC_REPORT_PATH:
+        try:
+            with open(SYNC_REPORT_PATH, "w", encoding="utf-8") as f:
+                json.dump(run, f, indent=2)
+            print(f"Wrote run report to {SYNC_REPORT_PATH}.")
+        except OSError as e:
+            print(f"Exception writing run report: {e}")
+
+    if SYNC_REPORT_TABLE:
+        try:
+            supabase.table(SYNC_REPORT_TABLE).insert({
+                "started_at": run["started_at"],
+                "duration_seconds": run["duration_seconds"],
+                "mode": run["mode"],
+                "success": success,
+                "report": run,
+            }).execute()
+        except Exception as e:
+            print(f"Exception storing run report: {e}")
 
+
+if __name__ == "__main__":
+    try:
+        load_spotify_cache()
+        load_locations()
+
+        # Setlists and upcoming concerts are synced concurrently, each as its own pipeline
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            flows = [executor.submit(sync_setlists), executor.submit(sync_upcoming_concerts)]
+        errors = [flow.exception() for flow in flows if flow.exception()]
+        for error in errors:
+            print(f"Exception during sync: {error}")
+
+        save_locations()
+        refresh_stats()
+        save_spotify_cache()
+        if SNAPSHOT_DIR:
+            export_snapshot()
+        bump_data_version()
+
+        if errors:
+            raise errors[0]
+    except BaseException:
+        write_run_report(success=False)
+        raise
+
+    write_run_report(success=True)
     print("Done.")